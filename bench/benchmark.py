@@ -0,0 +1,210 @@
+# Benchmark suite of the tfcpy commands, run against the local mock of the API (bench/mocktfc.py)
+# Every scenario runs the CLI in a new process (so the startup time is counted, as the users see it),
+# with a fresh copy of the organization for each repetition. The results are saved to a JSON file,
+# and can be compared with the results of a previous execution to find regressions.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage: python3 bench/benchmark.py [--sizes 50x5,250x20] [--repeat 3] [--latency 0.02] [--rate-limit 30]
+#                                   [--inject-429 0] [--scenarios list,vars,copy,delete,upload]
+#                                   [--output <results.json>] [--compare <old_results.json>] [-- <cli options>]
+#
+# Sizes are <workspaces>x<variables per workspace>. The options after "--" are passed to the CLI (like
+# "--no-async" or "--concurrency 20"), so the same scenarios can be measured with different settings.
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+import mocktfc
+
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+cli = os.path.join(repo,'pytfc.py')
+results_dir = os.path.join(repo,'bench','results')
+
+default_sizes = '50x5,250x20'
+default_scenarios = ['list','vars','copy','delete','upload']
+# Workspaces changed by the copy and delete scenarios (ws0000 is the source of the copy)
+targets = 'ws000*'
+# Relative slowdown of the median to report it as a regression
+default_threshold = 0.10
+
+# Function to parse the sizes argument: "50x5,250x20" -> [(50,5),(250,20)]
+def parse_sizes(text):
+    sizes = []
+    for item in text.split(','):
+        workspaces,variables = item.lower().split('x')
+        sizes.append((int(workspaces),int(variables)))
+    return sizes
+
+# Function to write the files used by the scenarios: a CSV file with new values for all the variables,
+# and a Terraform configuration to upload
+def write_inputs(workdir,variables):
+    varfile = os.path.join(workdir,'vars.csv')
+    with open(varfile,'w') as f:
+        f.write('name,value,category,sensitive\n')
+        for i in range(variables):
+            f.write('var%d,bench%d,terraform,false\n' % (i,i))
+    confdir = os.path.join(workdir,'config')
+    os.makedirs(confdir,exist_ok=True)
+    for i in range(200):
+        with open(os.path.join(confdir,'module%03d.tf' % i),'w') as f:
+            f.write(''.join('variable "v%d_%d" {\n  default = "%s"\n}\n' % (i,j,'x' * 64) for j in range(40)))
+    return varfile,confdir
+
+# Function to get the CLI arguments of a scenario
+def scenario_args(name,variables,varfile,confdir):
+    if name == 'list':
+        return ['list']
+    if name == 'vars':
+        return ['vars','ws0001','-f',varfile]
+    if name == 'copy':
+        return ['copy','ws0000','--match',targets]
+    if name == 'delete':
+        return ['delete','--match',targets,'--var'] + ['var%d' % i for i in range(0,variables,2)]
+    if name == 'upload':
+        return ['upload','ws0001','-d',confdir,'--select','always-new','--force']
+    raise ValueError('Unknown scenario: ' + name)
+
+# Function to run the CLI once and get its time, exit code and the requests seen by the server
+def run_cli(server,args,cli_options,env):
+    before = server.stats
+    command = [sys.executable,cli] + cli_options + ['--api',server.api,server.server.state.organization] + args
+    started = time.perf_counter()
+    result = subprocess.run(command,env=env,stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+    seconds = time.perf_counter() - started
+    after = server.stats
+    delta = {key: after[key] - before[key] for key in ('requests','throttled','injected')}
+    return seconds,result.returncode,delta,result.stdout.decode(errors='replace')
+
+# Function to run all the scenarios of a size. It returns {"<scenario>/<size>": result,...}
+def run_size(workspaces,variables,scenarios,args,cli_options,workdir):
+    results = {}
+    varfile,confdir = write_inputs(workdir,variables)
+    server = mocktfc.MockTFC(workspaces=workspaces,vars_per_workspace=variables,latency=args.latency,\
+        jitter=args.jitter,rate_limit=args.rate_limit,inject_429=args.inject_429).start()
+    try:
+        for name in scenarios:
+            key = '%s/%dx%d' % (name,workspaces,variables)
+            times,requests,throttled,injected = [],[],0,0
+            exit_code = 0
+            for _ in range(args.repeat):
+                # Every repetition starts from the same organization, and without the local caches
+                server.server.state.seed(workspaces,variables)
+                env = dict(os.environ,TOKEN='benchmark',XDG_CACHE_HOME=tempfile.mkdtemp(dir=workdir))
+                seconds,code,delta,output = run_cli(server,scenario_args(name,variables,varfile,confdir),\
+                    cli_options,env)
+                times.append(seconds)
+                requests.append(delta['requests'])
+                throttled += delta['throttled']
+                injected += delta['injected']
+                if code:
+                    exit_code = code
+                    print(output[-2000:])
+            results[key] = {'seconds': [round(t,4) for t in times],'median': round(statistics.median(times),4),\
+                'min': round(min(times),4),'requests': max(requests),'throttled': throttled,'injected': injected,\
+                'exit_code': exit_code}
+            print('%-22s median %7.3fs  min %7.3fs  requests %5d  429s %4d%s' % (key,results[key]['median'],\
+                results[key]['min'],results[key]['requests'],throttled + injected,\
+                '  EXIT CODE %d' % exit_code if exit_code else ''))
+            sys.stdout.flush()
+    finally:
+        server.stop()
+    return results
+
+# Function to get the git commit of the repository, to know what was measured
+def git_commit():
+    try:
+        return subprocess.run(['git','-C',repo,'rev-parse','--short','HEAD'],stdout=subprocess.PIPE,\
+            stderr=subprocess.DEVNULL).stdout.decode().strip() or None
+    except OSError:
+        return None
+
+# Function to compare the results with old ones. It returns the scenarios slower than the threshold
+def compare(old,new,threshold=default_threshold):
+    regressions = []
+    print('\n%-22s %10s %10s %8s %14s' % ('scenario','old','new','change','requests'))
+    for key,result in new['results'].items():
+        previous = old['results'].get(key)
+        if previous is None:
+            print('%-22s %10s %9.3fs' % (key,'-',result['median']))
+            continue
+        change = result['median'] / previous['median'] - 1 if previous['median'] else 0.0
+        mark = ''
+        if change > threshold:
+            regressions.append(key)
+            mark = '  REGRESSION'
+        print('%-22s %9.3fs %9.3fs %+7.1f%% %6d -> %-6d%s' % (key,previous['median'],result['median'],change * 100,\
+            previous['requests'],result['requests'],mark))
+    return regressions
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cli_options = []
+    if '--' in argv:
+        cli_options = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    parser = argparse.ArgumentParser(prog='benchmark',description='Benchmark of the tfcpy commands with a mock API')
+    parser.add_argument('--sizes',help='Organizations to test, as <workspaces>x<variables>[,...]',default=default_sizes)
+    parser.add_argument('--scenarios',help='Comma separated scenarios: ' + ','.join(default_scenarios),\
+        default=','.join(default_scenarios))
+    parser.add_argument('--repeat',help='Repetitions of every scenario (the median is compared)',type=int,default=3)
+    parser.add_argument('--latency',help='Seconds added by the mock server to every request',type=float,default=0.02)
+    parser.add_argument('--jitter',help='Max random seconds added to the latency',type=float,default=0.005)
+    parser.add_argument('--rate-limit',help='Requests per second allowed by the mock server (0 is no limit)',\
+        type=float,default=30,dest='rate_limit')
+    parser.add_argument('--inject-429',help='Probability of a random 429 answer',type=float,default=0.0,\
+        dest='inject_429')
+    parser.add_argument('--output',help='JSON file for the results (default bench/results/<date>-<commit>.json)')
+    parser.add_argument('--compare',help='JSON results of a previous execution to compare with',\
+        type=argparse.FileType('r'))
+    parser.add_argument('--threshold',help='Relative slowdown reported as a regression (default 0.10)',type=float,\
+        default=default_threshold)
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    for name in scenarios:
+        if name not in default_scenarios:
+            parser.error('unknown scenario "' + name + '"')
+    old = json.load(args.compare) if args.compare else None
+
+    workdir = tempfile.mkdtemp(prefix='tfcpy-bench-')
+    results = {}
+    try:
+        for workspaces,variables in parse_sizes(args.sizes):
+            results.update(run_size(workspaces,variables,scenarios,args,cli_options,workdir))
+    finally:
+        shutil.rmtree(workdir,ignore_errors=True)
+
+    report = {'meta': {'date': time.strftime('%Y-%m-%dT%H:%M:%S'),'commit': git_commit(),\
+        'python': platform.python_version(),'platform': platform.platform(),'cli_options': cli_options,\
+        'repeat': args.repeat,'latency': args.latency,'jitter': args.jitter,'rate_limit': args.rate_limit,\
+        'inject_429': args.inject_429},'results': results}
+    output = args.output
+    if output is None:
+        os.makedirs(results_dir,exist_ok=True)
+        output = os.path.join(results_dir,'%s-%s.json' % (time.strftime('%Y%m%d-%H%M%S'),report['meta']['commit']))
+    with open(output,'w') as f:
+        json.dump(report,f,indent=2)
+    print('Results saved to ' + output)
+
+    failed = [key for key,result in results.items() if result['exit_code']]
+    if old is not None:
+        regressions = compare(old,report,args.threshold)
+        if regressions:
+            print('\nRegressions (slower than %d%%): %s' % (args.threshold * 100,', '.join(regressions)))
+            raise SystemExit(1)
+    if failed:
+        raise SystemExit('Failed scenarios: ' + ', '.join(failed))
+
+if __name__ == '__main__':
+    main()
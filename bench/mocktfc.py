@@ -0,0 +1,402 @@
+# Local stand-in for the Terraform Cloud API, to test and measure the scripts without app.terraform.io
+# It implements the endpoints used by tfcpy (workspaces with pagination, vars CRUD, runs, configuration
+# versions and the upload url), keeping everything in memory, with configurable latency, rate limit
+# and 429 injection.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage: python3 bench/mocktfc.py [--port 8765] [--workspaces 100] [--vars 10] [--latency 0.02]
+#                                 [--rate-limit 30] [--inject-429 0.01] [--no-etag]
+#   TOKEN=x python3 pytfc.py --api http://127.0.0.1:8765/api/v2 <organization> list
+#
+# Or from Python (the benchmark suite does it):
+#   server = mocktfc.MockTFC(workspaces=100,vars_per_workspace=10).start()
+#   print(server.api)
+#   server.stop()
+#
+# Runs go through pending -> plan_queued -> planning -> applying -> applied (or planned if they are
+# not auto-applied) in "run_time" seconds. Runs with "fail" in the message end as errored.
+# GET /_stats returns the counters of the server, and POST /_reset seeds it again.
+
+
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import itertools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+default_port = 8765
+default_page_size = 20
+max_page_size = 100
+
+# Class with the data of the server (organization, workspaces, variables, runs...) and its counters
+class MockState:
+    def __init__(self,organization='myorg',workspaces=100,vars_per_workspace=10,seed=0):
+        self.organization = organization
+        # Reentrant, because the handlers send the answer (and count its bytes) with the lock held
+        self.lock = threading.RLock()
+        self.seed(workspaces,vars_per_workspace,seed)
+
+    def seed(self,workspaces,vars_per_workspace,seed=0):
+        rnd = random.Random(seed)
+        self.ids = itertools.count(1)
+        self.workspaces = {}
+        self.vars = {}
+        self.configs = {}
+        self.runs = {}
+        self.uploads = {}
+        self.stats = {'requests': 0, 'throttled': 0, 'injected': 0, 'bytes_in': 0, 'bytes_out': 0}
+        for i in range(workspaces):
+            wid = self.new_id('ws')
+            self.workspaces[wid] = {'id': wid, 'type': 'workspaces', 'attributes': {'name': 'ws%04d' % i,\
+                'terraform-version': '1.5.0', 'tag-names': ['t%d' % (i % 3)],\
+                'updated-at': '2024-01-%02dT00:00:00Z' % (1 + rnd.randrange(28))}}
+            self.vars[wid] = {}
+            self.configs[wid] = []
+            for j in range(vars_per_workspace):
+                self.add_var(wid,{'key': 'var%d' % j, 'value': 'value%d-%d' % (i,j), 'category': 'terraform',\
+                    'hcl': False, 'sensitive': False, 'description': ''})
+
+    def new_id(self,prefix):
+        return prefix + '-' + str(next(self.ids))
+
+    def add_var(self,wid,attributes):
+        vid = self.new_id('var')
+        self.vars[wid][vid] = {'id': vid, 'type': 'vars', 'attributes': dict(attributes)}
+        return self.vars[wid][vid]
+
+    # The API never returns the values of sensitive variables
+    def public_var(self,item):
+        if not item['attributes'].get('sensitive'):
+            return item
+        return dict(item,attributes=dict(item['attributes'],value=None))
+
+    def workspace_by_name(self,name):
+        for item in self.workspaces.values():
+            if item['attributes']['name'] == name:
+                return item
+        return None
+
+# Token bucket of the server, to answer with a 429 like TFC when there are too many requests
+class RateLimiter:
+    def __init__(self,rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Returns 0 if the request is allowed, or the seconds until the next token if not
+    def take(self):
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate,self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+# Function to get a page of a list like the API does (page[size] and page[number] params, and meta.pagination)
+def paginate(items,query):
+    size = min(max_page_size,int(query.get('page[size]',[default_page_size])[0]))
+    number = int(query.get('page[number]',['1'])[0])
+    total = max(1,(len(items) + size - 1) // size)
+    return {'data': items[(number - 1) * size:number * size], 'meta': {'pagination': {'current-page': number,\
+        'prev-page': number - 1 if number > 1 else None, 'next-page': number + 1 if number < total else None,\
+        'total-pages': total, 'total-count': len(items)}}}
+
+# Function to get the status of a run from the seconds since it was created
+def run_status(run,elapsed,run_time):
+    attributes = run['attributes']
+    steps = [(0.25,'pending'),(0.5,'plan_queued'),(0.75,'planning')]
+    for limit,status in steps:
+        if elapsed < limit * run_time:
+            return status
+    if 'fail' in (attributes.get('message') or ''):
+        return 'errored'
+    if not attributes.get('auto-apply'):
+        return 'planned'
+    return 'applying' if elapsed < run_time else 'applied'
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self,*args):
+        pass
+
+    def send(self,code,body=None,headers=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        # GET answers have an ETag, and a 304 with no body if the client has the same one
+        if self.command == 'GET' and code == 200 and self.server.etags:
+            etag = 'W/"' + hashlib.md5(data).hexdigest() + '"'
+            headers = dict(headers or {},ETag=etag)
+            if self.headers.get('If-None-Match') == etag:
+                code,data = 304,b''
+        self.send_response(code)
+        self.send_header('Content-Type','application/vnd.api+json')
+        for key,value in (headers or {}).items():
+            self.send_header(key,value)
+        self.send_header('Content-Length',str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with self.server.state.lock:
+            self.server.state.stats['bytes_out'] += len(data)
+
+    # The body is always read, so the kept-alive connection can be used again
+    def body(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            data = b''
+            while True:
+                size = int(self.rfile.readline().strip(),16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        else:
+            data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with self.server.state.lock:
+            self.server.state.stats['bytes_in'] += len(data)
+        return data
+
+    def json_body(self):
+        return json.loads(self.body() or b'{}')
+
+    def do_GET(self):
+        self.route('GET')
+
+    def do_POST(self):
+        self.route('POST')
+
+    def do_PATCH(self):
+        self.route('PATCH')
+
+    def do_PUT(self):
+        self.route('PUT')
+
+    def do_DELETE(self):
+        self.route('DELETE')
+
+    def route(self,method):
+        server = self.server
+        state = server.state
+        url = urlparse(self.path)
+        path,query = url.path,parse_qs(url.query)
+        if path == '/_stats':
+            with state.lock:
+                return self.send(200,dict(state.stats))
+        if path == '/_reset' and method == 'POST':
+            options = self.json_body()
+            with state.lock:
+                state.seed(options.get('workspaces',len(state.workspaces)),options.get('vars',0),options.get('seed',0))
+            return self.send(204)
+        with state.lock:
+            state.stats['requests'] += 1
+        if server.latency:
+            time.sleep(server.latency + random.uniform(0,server.jitter))
+        if path.startswith('/api/'):
+            wait = server.limiter.take()
+            injected = wait == 0 and server.inject_429 and random.random() < server.inject_429
+            if wait or injected:
+                if method in ('POST','PATCH','PUT'):
+                    self.body()
+                with state.lock:
+                    state.stats['injected' if injected else 'throttled'] += 1
+                if injected:
+                    return self.send(429,{'errors': [{'status': '429','title': 'Too many requests'}]},\
+                        {'Retry-After': '0.1'})
+                return self.send(429,{'errors': [{'status': '429','title': 'Too many requests'}]},\
+                    {'X-RateLimit-Limit': str(int(server.limiter.rate)),'X-RateLimit-Reset': '%.3f' % wait})
+        with state.lock:
+            return self.api(method,path,query,state)
+
+    # The API endpoints. They run with the state lock held
+    def api(self,method,path,query,state):
+        m = re.match(r'^/api/v2/organizations/([^/]+)/workspaces/?$',path)
+        if m:
+            if method == 'POST':
+                attributes = self.json_body()['data']['attributes']
+                if state.workspace_by_name(attributes.get('name')):
+                    return self.send(422,{'errors': [{'status': '422','detail': 'Name has already been taken'}]})
+                wid = state.new_id('ws')
+                state.workspaces[wid] = {'id': wid, 'type': 'workspaces', 'attributes': dict(attributes)}
+                state.vars[wid] = {}
+                state.configs[wid] = []
+                return self.send(201,{'data': state.workspaces[wid]})
+            items = sorted(state.workspaces.values(),key=lambda i: i['attributes']['name'])
+            if 'search[name]' in query:
+                items = [i for i in items if query['search[name]'][0] in i['attributes']['name']]
+            if 'search[tags]' in query:
+                tags = query['search[tags]'][0].split(',')
+                items = [i for i in items if all(t in i['attributes'].get('tag-names',[]) for t in tags)]
+            if 'fields[workspaces]' in query:
+                # Sparse fieldset: only the attributes asked for
+                fields = query['fields[workspaces]'][0].split(',')
+                items = [{'id': i['id'], 'type': i['type'], 'attributes': {k: v for k,v in i['attributes'].items()\
+                    if k in fields}} for i in items]
+            return self.send(200,paginate(items,query))
+        m = re.match(r'^/api/v2/organizations/([^/]+)/workspaces/([^/]+)$',path)
+        if m:
+            item = state.workspace_by_name(m.group(2))
+            if item is None:
+                return self.send(404,{'errors': [{'status': '404','title': 'not found'}]})
+            return self.send(200,{'data': item})
+        m = re.match(r'^/api/v2/workspaces/([^/]+)$',path)
+        if m:
+            if m.group(1) not in state.workspaces:
+                return self.send(404,{'errors': [{'status': '404','title': 'not found'}]})
+            if method == 'DELETE':
+                del state.workspaces[m.group(1)]
+                return self.send(204)
+            return self.send(200,{'data': state.workspaces[m.group(1)]})
+        m = re.match(r'^/api/v2/workspaces/([^/]+)/vars/?$',path)
+        if m:
+            wid = m.group(1)
+            if wid not in state.vars or wid not in state.workspaces:
+                return self.send(404,{'errors': [{'status': '404','title': 'not found'}]})
+            if method == 'POST':
+                attributes = self.json_body()['data']['attributes']
+                for item in state.vars[wid].values():
+                    if item['attributes']['key'] == attributes.get('key') and \
+                        item['attributes']['category'] == attributes.get('category'):
+                        return self.send(422,{'errors': [{'status': '422','detail': 'Key has already been taken'}]})
+                return self.send(201,{'data': state.public_var(state.add_var(wid,attributes))})
+            return self.send(200,paginate([state.public_var(i) for i in state.vars[wid].values()],query))
+        m = re.match(r'^/api/v2/workspaces/([^/]+)/vars/([^/]+)$',path)
+        if m:
+            wid,vid = m.groups()
+            if vid not in state.vars.get(wid,{}):
+                if method == 'PATCH':
+                    self.body()
+                return self.send(404,{'errors': [{'status': '404','title': 'not found'}]})
+            if method == 'DELETE':
+                del state.vars[wid][vid]
+                return self.send(204)
+            attributes = self.json_body()['data']['attributes']
+            # Like the API, a sensitive variable can't be made non-sensitive
+            if state.vars[wid][vid]['attributes'].get('sensitive') and attributes.get('sensitive') is False:
+                return self.send(422,{'errors': [{'status': '422','detail': 'Sensitive variables cannot be made '\
+                    'non-sensitive'}]})
+            state.vars[wid][vid]['attributes'].update(attributes)
+            return self.send(200,{'data': state.public_var(state.vars[wid][vid])})
+        m = re.match(r'^/api/v2/workspaces/([^/]+)/configuration-versions$',path)
+        if m:
+            wid = m.group(1)
+            attributes = self.json_body().get('data',{}).get('attributes',{}) if method == 'POST' else {}
+            if wid not in state.workspaces:
+                return self.send(404,{'errors': [{'status': '404','title': 'not found'}]})
+            if method == 'POST':
+                cid = state.new_id('cv')
+                config = {'id': cid, 'type': 'configuration-versions', 'attributes': {'status': 'pending',\
+                    'auto-queue-runs': attributes.get('auto-queue-runs',True) in (True,'true'),\
+                    'upload-url': 'http://%s/upload/%s' % (self.headers['Host'],cid)},\
+                    'links': {'self': '/api/v2/configuration-versions/' + cid}}
+                state.configs[wid].insert(0,config)
+                return self.send(201,{'data': config})
+            return self.send(200,paginate(state.configs[wid],query))
+        m = re.match(r'^/api/v2/configuration-versions/([^/]+)$',path)
+        if m:
+            for configs in state.configs.values():
+                for config in configs:
+                    if config['id'] == m.group(1):
+                        return self.send(200,{'data': config})
+            return self.send(404,{'errors': [{'status': '404','title': 'not found'}]})
+        m = re.match(r'^/upload/([^/]+)$',path)
+        if m and method == 'PUT':
+            state.uploads[m.group(1)] = len(self.body())
+            for configs in state.configs.values():
+                for config in configs:
+                    if config['id'] == m.group(1):
+                        config['attributes']['status'] = 'uploaded'
+            return self.send(200)
+        if path == '/api/v2/runs' and method == 'POST':
+            data = self.json_body()['data']
+            rid = state.new_id('run')
+            run = {'id': rid, 'type': 'runs', 'attributes': {'status': 'pending',\
+                'message': data['attributes'].get('message'), 'auto-apply': data['attributes'].get('auto-apply'),\
+                'is-destroy': data['attributes'].get('is-destroy')},\
+                'relationships': {'workspace': data['relationships']['workspace'],\
+                'plan': {'links': {'related': '/api/v2/runs/%s/plan' % rid}}}}
+            state.runs[rid] = (run,time.monotonic())
+            return self.send(201,{'data': run})
+        m = re.match(r'^/api/v2/runs/([^/]+)$',path)
+        if m and m.group(1) in state.runs:
+            run,created = state.runs[m.group(1)]
+            run['attributes']['status'] = run_status(run,time.monotonic() - created,self.server.run_time)
+            return self.send(200,{'data': run})
+        if method in ('POST','PATCH','PUT'):
+            self.body()
+        return self.send(404,{'errors': [{'status': '404','title': 'not found'}]})
+
+# Class to run the server in a thread
+class MockTFC:
+    def __init__(self,port=0,organization='myorg',workspaces=100,vars_per_workspace=10,latency=0.0,jitter=0.0,\
+        rate_limit=0,inject_429=0.0,run_time=2.0,seed=0,etags=True):
+        self.server = ThreadingHTTPServer(('127.0.0.1',port),Handler)
+        self.server.daemon_threads = True
+        self.server.state = MockState(organization,workspaces,vars_per_workspace,seed)
+        self.server.latency = latency
+        self.server.jitter = jitter
+        self.server.limiter = RateLimiter(rate_limit)
+        self.server.inject_429 = inject_429
+        self.server.run_time = run_time
+        self.server.etags = etags
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    @property
+    def api(self):
+        return self.url + '/api/v2'
+
+    @property
+    def stats(self):
+        with self.server.state.lock:
+            return dict(self.server.state.stats)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever,daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='mocktfc',description='Local stand-in for the Terraform Cloud API')
+    parser.add_argument('--port',type=int,default=default_port)
+    parser.add_argument('--organization',default='myorg')
+    parser.add_argument('--workspaces',help='Workspaces in the organization',type=int,default=100)
+    parser.add_argument('--vars',help='Variables in every workspace',type=int,default=10)
+    parser.add_argument('--latency',help='Seconds added to every request',type=float,default=0.0)
+    parser.add_argument('--jitter',help='Max random seconds added to the latency',type=float,default=0.0)
+    parser.add_argument('--rate-limit',help='Requests per second before answering 429 (0 is no limit)',type=float,\
+        default=0,dest='rate_limit')
+    parser.add_argument('--inject-429',help='Probability of answering 429 to any API request',type=float,default=0.0,\
+        dest='inject_429')
+    parser.add_argument('--no-etag',help='Don\'t send ETag headers (nor answer 304)',action='store_false',default=True,\
+        dest='etags')
+    parser.add_argument('--run-time',help='Seconds that a run takes to finish',type=float,default=2.0,dest='run_time')
+    args = parser.parse_args(argv)
+    server = MockTFC(args.port,args.organization,args.workspaces,args.vars,args.latency,args.jitter,args.rate_limit,\
+        args.inject_429,args.run_time,etags=args.etags)
+    print('Mock TFC API listening on ' + server.api + ' (organization "' + args.organization + '")')
+    sys.stdout.flush()
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
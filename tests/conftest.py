@@ -0,0 +1,5 @@
+# The tests import the tfcpy package from the repo directory, without installing it
+import os
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
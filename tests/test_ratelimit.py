@@ -0,0 +1,112 @@
+# Tests of the ratelimit module: the token bucket must keep the requests under the rate, and the
+# waits of a 429/503 response must be read from its Retry-After or X-RateLimit-Reset headers
+# Usage: python3 -m pytest tests
+
+
+import time
+import types
+from email.utils import formatdate
+import pytest
+from tfcpy import ratelimit
+
+# Clock that only moves when the test (or a sleep) moves it, so the waits are exact
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self,seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit,'time',types.SimpleNamespace(monotonic=clock.monotonic,sleep=clock.sleep,\
+        time=time.time))
+    return clock
+
+def response(**headers):
+    return types.SimpleNamespace(headers=headers)
+
+def test_bucket_burst_then_rate(clock):
+    bucket = ratelimit.TokenBucket(rate=10,burst=3)
+    assert [bucket.reserve() for i in range(3)] == [0.0,0.0,0.0]
+    # Without tokens every request waits 1/rate more than the one before it
+    assert [bucket.reserve() for i in range(3)] == pytest.approx([0.1,0.2,0.3])
+
+def test_bucket_refills(clock):
+    bucket = ratelimit.TokenBucket(rate=10,burst=2)
+    bucket.reserve()
+    bucket.reserve()
+    clock.now += 0.1
+    assert bucket.reserve() == 0.0
+    # The bucket never has more than "burst" tokens
+    clock.now += 60
+    assert [bucket.reserve() for i in range(3)] == pytest.approx([0.0,0.0,0.1])
+
+def test_bucket_default_burst(clock):
+    bucket = ratelimit.TokenBucket(rate=5)
+    assert [bucket.reserve() for i in range(5)] == [0.0] * 5
+    assert bucket.reserve() == pytest.approx(0.2)
+
+def test_bucket_acquire_sleeps(clock):
+    bucket = ratelimit.TokenBucket(rate=4,burst=1)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(0.25)
+    assert clock.slept == pytest.approx([0.25])
+
+@pytest.mark.parametrize('rate',[0,-1])
+def test_bucket_without_limit(clock,rate):
+    bucket = ratelimit.TokenBucket(rate=rate)
+    assert [bucket.reserve() for i in range(100)] == [0.0] * 100
+    assert clock.slept == []
+
+def test_bucket_pause(clock):
+    bucket = ratelimit.TokenBucket(rate=10,burst=5)
+    bucket.pause(2)
+    assert bucket.reserve() == pytest.approx(2)
+    # A shorter pause doesn't shorten the one in place
+    bucket.pause(1)
+    assert bucket.reserve() == pytest.approx(2)
+    clock.now += 2
+    # When the pause ends the bucket has refilled, so the requests go on without waiting
+    assert bucket.reserve() == 0.0
+
+def test_retry_after_seconds():
+    assert ratelimit.retry_after(response(**{'Retry-After': '3'})) == 3.0
+    assert ratelimit.retry_after(response(**{'Retry-After': '0.5'})) == 0.5
+    assert ratelimit.retry_after(response(**{'Retry-After': '-2'})) == 0.0
+
+def test_retry_after_http_date():
+    wait = ratelimit.retry_after(response(**{'Retry-After': formatdate(time.time() + 30,usegmt=True)}))
+    assert 28 <= wait <= 30
+    past = formatdate(time.time() - 30,usegmt=True)
+    assert ratelimit.retry_after(response(**{'Retry-After': past})) == 0.0
+
+def test_retry_after_rate_limit_reset():
+    assert ratelimit.retry_after(response(**{'X-RateLimit-Reset': '0.25'})) == 0.25
+    # Retry-After is used first, and a value that can't be read falls back to X-RateLimit-Reset
+    headers = {'Retry-After': '4', 'X-RateLimit-Reset': '0.25'}
+    assert ratelimit.retry_after(response(**headers)) == 4.0
+    headers = {'Retry-After': 'soon', 'X-RateLimit-Reset': '0.25'}
+    assert ratelimit.retry_after(response(**headers)) == 0.25
+
+def test_retry_after_missing():
+    assert ratelimit.retry_after(response()) is None
+    assert ratelimit.retry_after(response(**{'Retry-After': 'soon'})) is None
+    assert ratelimit.retry_after(response(**{'X-RateLimit-Reset': 'soon'})) is None
+
+def test_backoff_bounds():
+    for attempt in range(12):
+        limit = min(ratelimit.backoff_max,ratelimit.backoff_base * 2 ** attempt)
+        assert all(0 <= ratelimit.backoff(attempt) <= limit for i in range(50))
+
+@pytest.mark.parametrize('method,status,retry',[
+    ('GET',429,True),('POST',429,True),('get',503,True),('PATCH',500,True),('DELETE',504,True),
+    ('POST',500,False),('POST',503,False),('GET',404,False),('GET',200,False),('PUT',501,False)])
+def test_should_retry(method,status,retry):
+    assert ratelimit.should_retry(method,status) is retry
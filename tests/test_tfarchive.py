@@ -0,0 +1,174 @@
+# Tests of the tfarchive module: the parallel gzip compressor must write a stream that any gzip reader
+# decompresses to the same data, and the .terraformignore rules must exclude the same paths as Terraform
+# Usage: python3 -m pytest tests
+
+
+import io
+import gzip
+import random
+import pytest
+from tfcpy import tfarchive
+
+# Text (compressible, with matches across the blocks) and random bytes (not compressible)
+def sample(size,seed=0):
+    rnd = random.Random(seed)
+    words = [('word%d ' % i).encode() for i in range(500)]
+    data = bytearray()
+    while len(data) < size:
+        data.extend(rnd.choice(words) if rnd.random() < 0.8 else rnd.randbytes(64))
+    return bytes(data[:size])
+
+def parallel_gzip(data,workers,size,writes=None,level=tfarchive.gzip_level):
+    out = io.BytesIO()
+    with tfarchive.ParallelGzipWriter(out,level=level,workers=workers,size=size) as writer:
+        # The data is written in pieces that don't match the blocks
+        step = writes or len(data) or 1
+        for i in range(0,len(data),step):
+            writer.write(data[i:i + step])
+    return out.getvalue()
+
+@pytest.mark.parametrize('workers',[1,2,4,8])
+@pytest.mark.parametrize('size',[1024,32768,40000,tfarchive.block_size])
+def test_parallel_gzip_round_trip(workers,size):
+    for length in (0,1,size - 1,size,size + 1,3 * size,5 * size + 12345):
+        data = sample(length,seed=length)
+        assert gzip.decompress(parallel_gzip(data,workers,size,writes=7919)) == data
+
+@pytest.mark.parametrize('level',[1,6,9])
+def test_parallel_gzip_levels(level):
+    data = sample(300000)
+    assert gzip.decompress(parallel_gzip(data,4,65536,level=level)) == data
+
+def test_parallel_gzip_is_deterministic():
+    data = sample(500000)
+    assert parallel_gzip(data,4,32768) == parallel_gzip(data,2,32768) == parallel_gzip(data,1,32768)
+
+def test_parallel_gzip_ratio():
+    # Priming every block with the previous one keeps the ratio close to single threaded gzip
+    data = sample(1000000)
+    assert len(parallel_gzip(data,4,tfarchive.block_size)) < len(gzip.compress(data,9)) * 1.05
+
+def test_parallel_gzip_member_trailer():
+    data = sample(200000)
+    member = parallel_gzip(data,4,16384)
+    # A single gzip member: the trailer has the CRC and the size of all the blocks
+    with gzip.GzipFile(fileobj=io.BytesIO(member)) as f:
+        assert f.read() == data
+    assert int.from_bytes(member[-4:],'little') == len(data)
+
+def test_create_archive_workers(tmp_path):
+    tardir = tmp_path / 'config'
+    tardir.mkdir()
+    for i in range(20):
+        (tardir / ('module%02d.tf' % i)).write_bytes(sample(50000,seed=i))
+    archives = {}
+    for workers in (1,4):
+        path,digest = tfarchive.create_archive(str(tardir),str(tmp_path / ('w%d.tar.gz' % workers)),workers=workers)
+        with open(path,'rb') as f:
+            archives[workers] = gzip.decompress(f.read())
+    assert archives[1] == archives[4]
+
+def make_tree(root,paths):
+    for path in paths:
+        if path.endswith('/'):
+            (root / path).mkdir(parents=True,exist_ok=True)
+        else:
+            (root / path).parent.mkdir(parents=True,exist_ok=True)
+            (root / path).write_text(path)
+
+def test_ignore_defaults():
+    rules = tfarchive.IgnoreRules()
+    assert rules.excluded('.git',True)
+    assert rules.excluded('.terraform',True)
+    assert not rules.excluded('.terraform/modules',True,excluded=True)
+    assert rules.excluded('terraform.tfstate',False)
+    assert rules.excluded('envs/prod/terraform.tfstate',False)
+    assert not rules.excluded('main.tf',False)
+
+def test_ignore_negation_last_rule_wins():
+    rules = tfarchive.IgnoreRules(['*.log','!keep.log'])
+    assert rules.excluded('debug.log',False)
+    assert not rules.excluded('keep.log',False)
+    assert not rules.excluded('logs/keep.log',False)
+    # The order matters: the last rule that matches is the one used
+    rules = tfarchive.IgnoreRules(['!keep.log','*.log'])
+    assert rules.excluded('keep.log',False)
+
+def test_ignore_negation_inside_excluded_dir():
+    rules = tfarchive.IgnoreRules(['vendor/','!vendor/keep/'])
+    assert rules.excluded('vendor',True)
+    assert rules.may_include_under('vendor')
+    assert not rules.excluded('vendor/keep',True,excluded=True)
+    # What is under an excluded dir is excluded too, unless a rule includes it again
+    assert rules.excluded('vendor/other',True,excluded=True)
+    assert not rules.may_include_under('build')
+
+def test_ignore_dir_only_patterns():
+    rules = tfarchive.IgnoreRules(['build/'])
+    assert rules.excluded('build',True)
+    assert rules.excluded('modules/build',True)
+    assert not rules.excluded('build',False)
+
+def test_ignore_anchored_patterns():
+    rules = tfarchive.IgnoreRules(['/docs','tmp/*.txt'])
+    assert rules.excluded('docs',True)
+    assert not rules.excluded('modules/docs',True)
+    assert rules.excluded('tmp/a.txt',False)
+    assert not rules.excluded('modules/tmp/a.txt',False)
+    assert not rules.excluded('tmp/sub/a.txt',False)
+
+def test_ignore_double_star():
+    rules = tfarchive.IgnoreRules(['**/cache','logs/**'])
+    assert rules.excluded('cache',True)
+    assert rules.excluded('a/b/cache',False)
+    assert rules.excluded('logs/x',False)
+    assert rules.excluded('logs/a/b.txt',False)
+    assert not rules.excluded('logs',False)
+
+def test_ignore_bracket_classes():
+    rules = tfarchive.IgnoreRules(['[a!]x'])
+    assert rules.excluded('ax',False)
+    assert rules.excluded('!x',False)
+    assert not rules.excluded('^x',False)
+    assert not rules.excluded('bx',False)
+    # Only a leading "!" or "^" negates the class
+    rules = tfarchive.IgnoreRules(['[!a]x','[^b]y','[c^]z'])
+    assert rules.excluded('bx',False)
+    assert not rules.excluded('ax',False)
+    assert rules.excluded('ay',False)
+    assert not rules.excluded('by',False)
+    assert rules.excluded('^z',False)
+    assert not rules.excluded('dz',False)
+
+def test_ignore_comments_and_blank_lines():
+    rules = tfarchive.IgnoreRules(['# main.tf','','   '])
+    assert rules.rules == []
+    assert not rules.excluded('main.tf',False)
+
+def test_walk_with_terraformignore(tmp_path):
+    make_tree(tmp_path,['main.tf','terraform.tfstate','debug.log','keep.log','build/out.bin',\
+        '.git/HEAD','.terraform/providers/p','.terraform/modules/m/main.tf','vendor/a.tf','vendor/keep/b.tf'])
+    (tmp_path / '.terraformignore').write_text('# Comment\n*.log\n!keep.log\nbuild/\nvendor/\n!vendor/keep/\n')
+    stats = tfarchive.new_stats()
+    rules = tfarchive.IgnoreRules.from_dir(str(tmp_path))
+    paths = [relpath for path,relpath in tfarchive.walk(str(tmp_path),rules,stats)]
+    assert paths == ['.terraform/modules','.terraform/modules/m','.terraform/modules/m/main.tf',\
+        '.terraformignore','keep.log','main.tf','vendor/keep','vendor/keep/b.tf']
+    # The pruned directories (.git, build and .terraform/providers) are counted, but their content is not read,
+    # so the skipped files are only terraform.tfstate, debug.log and vendor/a.tf
+    assert stats['pruned_dirs'] == 3
+    assert stats['files'] == 5
+    assert stats['skipped_files'] == 3
+
+def test_walk_does_not_read_pruned_dirs(tmp_path,monkeypatch):
+    make_tree(tmp_path,['main.tf','.git/objects/a','.terraform/providers/p'])
+    scanned = []
+    scandir = tfarchive.os.scandir
+    def tracking_scandir(path):
+        scanned.append(path)
+        return scandir(path)
+    monkeypatch.setattr(tfarchive.os,'scandir',tracking_scandir)
+    stats = tfarchive.new_stats()
+    list(tfarchive.walk(str(tmp_path),tfarchive.IgnoreRules(),stats))
+    assert sorted(scanned) == [str(tmp_path),str(tmp_path / '.terraform')]
+    assert stats['pruned_dirs'] == 2
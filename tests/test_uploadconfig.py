@@ -0,0 +1,150 @@
+# Tests of the uploadconfig module against the local mock of the API (bench/mocktfc.py): which configuration
+# version is skipped, reused or created for an upload
+# Usage: python3 -m pytest tests
+
+
+import pytest
+import requests
+from bench import mocktfc
+from tfcpy import tfcclient
+from tfcpy import uploadconfig
+
+@pytest.fixture(scope='module')
+def server():
+    server = mocktfc.MockTFC(workspaces=2,vars_per_workspace=0).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def client(server):
+    with server.server.state.lock:
+        server.server.state.seed(2,0)
+    with tfcclient.TFCClient('token',api=server.api) as client:
+        yield client
+
+@pytest.fixture
+def upload(tmp_path):
+    tardir = tmp_path / 'config'
+    tardir.mkdir()
+    (tardir / 'main.tf').write_text('resource "null_resource" "test" {}\n')
+    upfile,digest = uploadconfig.create_upload(str(tardir),str(tmp_path / 'config.tar.gz'))
+    assert digest == uploadconfig.config_hash(str(tardir))
+    return upfile,digest,str(tmp_path / 'uploads.json')
+
+def workspace_id(client):
+    return uploadconfig.get_workspc_id('myorg','ws0000',client)
+
+# An upload that created its configuration version but didn't finish
+def interrupted(wid,digest,queue,client,path):
+    config = uploadconfig.create_config_version(wid,queue,client)
+    uploadconfig.record_upload(wid,digest,config['id'],done=False,path=path)
+    return config['id']
+
+def upload_workspace(wid,upload,queue,client,**kwargs):
+    upfile,digest,path = upload
+    return uploadconfig.upload_workspace(wid,upfile,digest,queue,client,path=path,**kwargs)
+
+def queued(server,config_id):
+    for configs in server.server.state.configs.values():
+        for config in configs:
+            if config['id'] == config_id:
+                return config['attributes']['auto-queue-runs']
+
+def test_upload_then_skip(server,client,upload):
+    wid = workspace_id(client)
+    status,config_id = upload_workspace(wid,upload,True,client)
+    assert status == 'uploaded'
+    assert upload_workspace(wid,upload,True,client) == ('skipped',config_id)
+    assert upload_workspace(wid,upload,True,client,force=True)[0] == 'uploaded'
+
+@pytest.mark.parametrize('queue',[True,False,'true','false'])
+def test_reuse_pending_same_queue(server,client,upload,queue):
+    wid = workspace_id(client)
+    pending = interrupted(wid,upload[1],queue,client,upload[2])
+    assert upload_workspace(wid,upload,queue,client) == ('reused',pending)
+
+@pytest.mark.parametrize('first,second',[(False,True),(True,False),('false','true'),('true','false')])
+def test_pending_other_queue_not_reused(server,client,upload,first,second):
+    # An upload without --run can't be finished by an upload with --run (no run would be queued), and
+    # the other way around (a run would be queued, and maybe applied, without asking for it)
+    wid = workspace_id(client)
+    pending = interrupted(wid,upload[1],first,client,upload[2])
+    status,config_id = upload_workspace(wid,upload,second,client)
+    assert status == 'uploaded'
+    assert config_id != pending
+    assert queued(server,config_id) == (second in (True,'true'))
+
+def test_always_new_never_reuses(server,client,upload):
+    wid = workspace_id(client)
+    pending = interrupted(wid,upload[1],True,client,upload[2])
+    status,config_id = upload_workspace(wid,upload,True,client,policy='always-new')
+    assert status == 'uploaded'
+    assert config_id != pending
+
+@pytest.mark.parametrize('queue,other',[(True,False),(False,True)])
+def test_find_config_by_hash_same_queue(server,client,upload,queue,other):
+    wid = workspace_id(client)
+    pending = interrupted(wid,upload[1],queue,client,upload[2])
+    find = lambda queue: uploadconfig.find_config(wid,client,'reuse-by-hash',upload[1],queue,upload[2])
+    assert find(queue)['id'] == pending
+    assert find(other) is None
+    # Other content never reuses it
+    assert uploadconfig.find_config(wid,client,'reuse-by-hash','other',queue,upload[2]) is None
+
+@pytest.mark.parametrize('queue,other',[(True,False),(False,True)])
+def test_find_config_newest_pending_same_queue(server,client,upload,queue,other):
+    wid = workspace_id(client)
+    older = uploadconfig.create_config_version(wid,queue,client)['id']
+    newest = uploadconfig.create_config_version(wid,other,client)['id']
+    find = lambda queue: uploadconfig.find_config(wid,client,'reuse-newest-pending',queue=queue)
+    assert find(queue)['id'] == older
+    assert find(other)['id'] == newest
+    assert find(None)['id'] == newest
+
+# Workspace cache that only keeps what the tests need (wscache.WorkspaceCache has the same methods)
+class Cache:
+    def __init__(self,ids):
+        self.ids = dict(ids)
+
+    def get(self,org,name):
+        return self.ids.get((org,name))
+
+    def set(self,org,name,wid):
+        self.ids[(org,name)] = wid
+
+    def invalidate(self,org,name):
+        self.ids.pop((org,name),None)
+
+def test_api_errors_are_raised(server,client,upload):
+    # A library function never exits, the HTTP errors are raised for the caller
+    with pytest.raises(requests.exceptions.HTTPError) as err:
+        uploadconfig.get_workspc_id('myorg','missing',client)
+    assert err.value.response.status_code == 404
+    with pytest.raises(requests.exceptions.HTTPError):
+        uploadconfig.create_config_version('ws-missing',True,client)
+    assert uploadconfig.get_config('cv-missing',client) is None
+
+def test_missing_workspace_is_invalidated(server,client):
+    cache = Cache({})
+    wid = uploadconfig.get_workspc_id('myorg','ws0000',client,cache)
+    assert cache.get('myorg','ws0000') == wid
+    # The name of a deleted workspace is removed from the cache before the error is raised
+    cache.ids[('myorg','missing')] = None
+    with pytest.raises(requests.exceptions.HTTPError):
+        uploadconfig.get_workspc_id('myorg','missing',client,cache)
+    assert ('myorg','missing') not in cache.ids
+
+def test_upload_many_errors(server,client,upload):
+    upfile,digest,path = upload
+    wid = workspace_id(client)
+    results = uploadconfig.upload_many({wid: 'ws0000', 'ws-missing': 'missing'},upfile,digest,True,client,\
+        workers=2,path=path)
+    assert [(i['workspace'],i['status']) for i in results] == [('ws0000','uploaded'),('missing','error')]
+    assert '404' in results[1]['error'] and 'not found' in results[1]['error']
+
+def test_archived_hash(capsys):
+    assert uploadconfig.archived_hash('abc','abc') == 'abc'
+    assert capsys.readouterr().out == ''
+    # If the configuration changed after it was hashed, the hash of what was uploaded is recorded
+    assert uploadconfig.archived_hash('abc','def') == 'def'
+    assert 'changed' in capsys.readouterr().out
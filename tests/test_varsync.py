@@ -0,0 +1,111 @@
+# Tests of the plans of the varsync module (what is created, updated or deleted in the workspaces)
+# Usage: python3 -m pytest tests
+
+
+from tfcpy import records
+from tfcpy import varsync
+
+def existing_var(var_id,key,value,category='terraform',sensitive=False,hcl=False):
+    # Sensitive values are never returned by the API
+    return records.Variable(id=var_id,key=key,value=None if sensitive else value,category=category,hcl=hcl,\
+        sensitive=sensitive)
+
+def actions(plan):
+    return [(i['action'],i['key'],i['category'],i['id']) for i in plan]
+
+def test_plan_create_update_noop():
+    existing = [existing_var('var-1','a','1'),existing_var('var-2','b','2')]
+    desired = [varsync.new_var('a','1'),varsync.new_var('b','new'),varsync.new_var('c','3')]
+    assert actions(varsync.plan_vars(existing,desired)) == [('noop','a','terraform','var-1'),\
+        ('update','b','terraform','var-2'),('create','c','terraform',None)]
+
+def test_plan_key_and_category():
+    # The same key in other category is a different variable
+    existing = [existing_var('var-1','a','1','terraform')]
+    plan = varsync.plan_vars(existing,[varsync.new_var('a','1','env')])
+    assert actions(plan) == [('create','a','env',None)]
+
+def test_plan_last_value_wins():
+    plan = varsync.plan_vars([],[varsync.new_var('a','1'),varsync.new_var('a','2')])
+    assert actions(plan) == [('create','a','terraform',None)]
+    assert plan[0]['var'].value == '2'
+
+def test_plan_hcl_change():
+    existing = [existing_var('var-1','a','[1]')]
+    assert actions(varsync.plan_vars(existing,[varsync.new_var('a','[1]',hcl='true')])) == \
+        [('update','a','terraform','var-1')]
+
+def test_plan_prune():
+    existing = [existing_var('var-1','a','1'),existing_var('var-2','b','2','env')]
+    plan = varsync.plan_vars(existing,[varsync.new_var('a','1')],prune=True)
+    assert actions(plan) == [('noop','a','terraform','var-1'),('delete','b','env','var-2')]
+    assert actions(varsync.plan_vars(existing,[varsync.new_var('a','1')])) == [('noop','a','terraform','var-1')]
+
+def test_plan_sensitive_always_updated():
+    existing = [existing_var('var-1','a','secret',sensitive=True)]
+    plan = varsync.plan_vars(existing,[varsync.new_var('a','secret',sensitive=True)])
+    assert actions(plan) == [('update','a','terraform','var-1')]
+
+def test_plan_sensitive_stays_sensitive():
+    # The API rejects making a sensitive variable non-sensitive, so the update keeps it sensitive
+    existing = [existing_var('var-1','a','secret',sensitive=True)]
+    plan = varsync.plan_vars(existing,[varsync.new_var('a','other')])
+    assert actions(plan) == [('update','a','terraform','var-1')]
+    method,url,payload = varsync.action_request('ws-1',plan[0])
+    assert (method,url) == ('PATCH','/workspaces/ws-1/vars/var-1')
+    assert payload['data']['id'] == 'var-1'
+    assert payload['data']['attributes']['sensitive'] is True
+    assert payload['data']['attributes']['value'] == 'other'
+
+def test_plan_make_sensitive():
+    existing = [existing_var('var-1','a','1')]
+    plan = varsync.plan_vars(existing,[varsync.new_var('a','1',sensitive='true')])
+    assert actions(plan) == [('update','a','terraform','var-1')]
+    assert plan[0]['var'].sensitive is True
+
+def test_action_requests():
+    plan = varsync.plan_vars([existing_var('var-1','a','1'),existing_var('var-2','b','2')],\
+        [varsync.new_var('a','1'),varsync.new_var('c','3','env')],prune=True)
+    calls = [varsync.action_request('ws-1',i) for i in plan]
+    assert calls[0] is None
+    assert calls[1][:2] == ('POST','/workspaces/ws-1/vars')
+    assert 'id' not in calls[1][2]['data']
+    assert calls[1][2]['data']['attributes'] == {'key': 'c', 'value': '3', 'category': 'env', 'hcl': False,\
+        'sensitive': False}
+    assert calls[2] == ('DELETE','/workspaces/ws-1/vars/var-2',None)
+
+def test_payloads_are_not_shared():
+    plan = varsync.plan_vars([],[varsync.new_var('a','1')])
+    first = varsync.action_request('ws-1',plan[0])[2]
+    first['data']['attributes']['value'] = 'changed'
+    assert varsync.action_request('ws-2',plan[0])[2]['data']['attributes']['value'] == '1'
+
+def test_plan_copy():
+    source = [existing_var('var-1','a','1'),existing_var('var-2','b','2','env'),existing_var('var-3','c','3')]
+    existing = [existing_var('var-10','a','1'),existing_var('var-11','b','old','env')]
+    assert actions(varsync.plan_copy(existing,source)) == [('noop','a','terraform','var-10'),\
+        ('update','b','env','var-11'),('create','c','terraform',None)]
+
+def test_plan_copy_sensitive_skipped():
+    # The values of sensitive variables are null in the API, so they are never created nor overwritten
+    source = [existing_var('var-1','a','secret',sensitive=True),existing_var('var-2','b','secret',sensitive=True),\
+        existing_var('var-3','c','secret',sensitive=True)]
+    existing = [existing_var('var-10','a','other',sensitive=True),existing_var('var-11','b','other')]
+    plan = varsync.plan_copy(existing,source)
+    assert actions(plan) == [('skip','a','terraform','var-10'),('skip','b','terraform','var-11'),\
+        ('skip','c','terraform',None)]
+    assert [varsync.action_request('ws-1',i) for i in plan] == [None,None,None]
+
+def test_apply_skips_nothing_to_send():
+    plan = varsync.plan_copy([],[existing_var('var-1','a','secret',sensitive=True)])
+    assert varsync.apply_plans(None,[('ws-1',plan)]) == []
+
+def test_plan_delete():
+    existing = [existing_var('var-1','a','1'),existing_var('var-2','a','1','env'),existing_var('var-3','AWS_KEY','x'),\
+        existing_var('var-4','b','2')]
+    assert actions(varsync.plan_delete(existing,keys=['a'])) == [('delete','a','terraform','var-1'),\
+        ('delete','a','env','var-2')]
+    assert actions(varsync.plan_delete(existing,pattern='^AWS_')) == [('delete','AWS_KEY','terraform','var-3')]
+    assert actions(varsync.plan_delete(existing,keys=['b'],pattern='^AWS_')) == \
+        [('delete','AWS_KEY','terraform','var-3'),('delete','b','terraform','var-4')]
+    assert varsync.plan_delete(existing,keys=['missing']) == []
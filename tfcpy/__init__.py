@@ -0,0 +1,40 @@
+# tfcpy: Python library and CLI for the Terraform Cloud/Enterprise API
+# Importing the package doesn't read any credentials nor load any module: the modules (and the names
+# below) are imported the first time they are used, so "import tfcpy" is fast.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   import tfcpy
+#   token,source = tfcpy.load_token()
+#   client = tfcpy.TFCClient(token,api='https://app.terraform.io/api/v2')
+#   print(tfcpy.workspaces.getlist(client,'<org>'))
+
+
+import importlib
+
+# Modules of the package
+submodules = ('apitrace','cli','credentials','httpcache','jsonapi','lazy','ratelimit','records','runwatch',\
+    'tfarchive','tfcasync','tfcclient','uploadconfig','varsync','workspaces','wscache','wsindex')
+
+# Names of the package API: {name: (module, attribute)}
+exports = {
+    'TFCClient': ('tfcclient','TFCClient'),
+    'AsyncTFCClient': ('tfcasync','AsyncTFCClient'),
+    'WorkspaceCache': ('wscache','WorkspaceCache'),
+    'WorkspaceIndex': ('wsindex','WorkspaceIndex'),
+    'Tracer': ('apitrace','Tracer'),
+    'load_token': ('credentials','load_token'),
+    'tfapi': ('tfcclient','tfapi'),
+}
+
+def __getattr__(name):
+    if name in submodules:
+        return importlib.import_module('.' + name,__name__)
+    if name in exports:
+        module,attribute = exports[name]
+        return getattr(importlib.import_module('.' + module,__name__),attribute)
+    raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
+
+def __dir__():
+    return sorted(list(globals()) + list(submodules) + list(exports))
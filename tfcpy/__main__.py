@@ -0,0 +1,4 @@
+# Entry point for "python3 -m tfcpy <organization> <command> [options]"
+from .cli import main
+
+main()
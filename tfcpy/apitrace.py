@@ -0,0 +1,106 @@
+# Python module to trace the API calls of the clients (tfcclient and tfcasync)
+# Every API call (with its retries) is reported to the functions in the "hooks" list of the client as a
+# record: method, endpoint template, status, bytes, latency, retries and seconds waiting for the rate
+# limit. The Tracer hook keeps the records, writes them as JSON lines, and prints a summary by endpoint.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import TFCClient, apitrace
+#   client = TFCClient(token)
+#   tracer = apitrace.Tracer(open('trace.jsonl','w'))
+#   client.hooks.append(tracer)
+#   ...
+#   tracer.print_summary()
+
+
+import re
+import sys
+import json
+import math
+import threading
+from urllib.parse import urlparse
+
+# Prefixes of the TFC ids, and the name of the placeholder in the endpoint templates
+id_names = {'ws': 'workspace_id', 'var': 'var_id', 'run': 'run_id', 'cv': 'configuration_version_id',\
+    'plan': 'plan_id', 'apply': 'apply_id', 'sv': 'state_version_id', 'pol': 'policy_id',\
+    'polset': 'policy_set_id', 'prj': 'project_id', 'team': 'team_id', 'user': 'user_id'}
+id_regex = re.compile(r'^(' + '|'.join(id_names) + r')-\w+$')
+
+# Function to get the template of an API url, so the calls can be grouped by endpoint:
+# "https://app.terraform.io/api/v2/workspaces/ws-XXX/vars" -> "/workspaces/:workspace_id/vars".
+# The urls out of the API (like the upload urls of configuration versions) are grouped by host
+def endpoint(api,url):
+    if not url.startswith(api):
+        return '<' + urlparse(url).netloc + '>'
+    segments = urlparse(url).path[len(urlparse(api).path):].strip('/').split('/')
+    template = []
+    for i,segment in enumerate(segments):
+        if i > 0 and segments[i - 1] == 'organizations':
+            template.append(':organization')
+        elif i == 3 and segments[0] == 'organizations' and segments[2] == 'workspaces':
+            template.append(':workspace_name')
+        elif id_regex.match(segment):
+            template.append(':' + id_names[segment.split('-',1)[0]])
+        else:
+            template.append(segment)
+    return '/' + '/'.join(template)
+
+# Function to get the size of a request body, or None if it's a file or a stream
+def body_size(body):
+    if isinstance(body,bytes):
+        return len(body)
+    if isinstance(body,str):
+        return len(body.encode())
+    return 0 if body is None else None
+
+# Function to get a percentile (nearest rank) from a sorted list of values
+def percentile(values,percent):
+    if not values:
+        return 0.0
+    return values[max(0,math.ceil(percent / 100.0 * len(values)) - 1)]
+
+# Hook that keeps the records of the calls, and writes them as JSON lines to "output" if it's set.
+# It can be used from many threads
+class Tracer:
+    def __init__(self,output=None):
+        self.output = output
+        self.records = []
+        self.lock = threading.Lock()
+
+    def __call__(self,record):
+        with self.lock:
+            self.records.append(record)
+            if self.output is not None:
+                self.output.write(json.dumps(record) + '\n')
+                self.output.flush()
+
+    # Function to get the metrics of every endpoint (method and template), sorted by total time
+    def summary(self):
+        groups = {}
+        with self.lock:
+            for record in self.records:
+                groups.setdefault((record['method'],record['endpoint']),[]).append(record)
+        summary = []
+        for (method,template),records in groups.items():
+            latencies = sorted(r['seconds'] for r in records)
+            summary.append({'method': method, 'endpoint': template, 'calls': len(records),\
+                'errors': sum(1 for r in records if r['error'] or (r['status'] or 0) >= 400),\
+                'retries': sum(r['retries'] for r in records), 'p50': percentile(latencies,50),\
+                'p95': percentile(latencies,95), 'total': sum(latencies),\
+                'throttled': sum(r['throttled'] for r in records),\
+                'bytes_received': sum(r['bytes_received'] or 0 for r in records)})
+        return sorted(summary,key=lambda i: i['total'],reverse=True)
+
+    def print_summary(self,file=sys.stdout):
+        summary = self.summary()
+        if not summary:
+            return
+        width = max(len(i['endpoint']) for i in summary)
+        print('\nAPI calls by endpoint (the time includes retries and rate limit waits):',file=file)
+        print('%-6s %-*s %6s %6s %7s %8s %8s %9s %9s %10s' % ('method',width,'endpoint','calls','errors','retries',\
+            'p50','p95','total','throttled','received'),file=file)
+        for i in summary:
+            print('%-6s %-*s %6d %6d %7d %7.3fs %7.3fs %8.3fs %8.3fs %10d' % (i['method'],width,i['endpoint'],\
+                i['calls'],i['errors'],i['retries'],i['p50'],i['p95'],i['total'],i['throttled'],\
+                i['bytes_received']),file=file)
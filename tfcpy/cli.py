@@ -0,0 +1,670 @@
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Command line interface of tfcpy (run with pytfc.py, tfcpy.sh or "python3 -m tfcpy")
+# Only the arguments are parsed when importing it: the token is read, and the API client is created,
+# when a command needs them. The heavy modules (requests, asyncio, aiohttp) are loaded when used.
+#
+# Usage: python3 pytfc.py <organization>  list|create|delete|copy|run|vars|upload|index [options] [-h]
+#     list_options: [-w <workspace>] [-h]
+#     create_options: <workspace> [--json <json_file>] [-h]
+#     delete_options: <workspace> [--var] [-h]
+#     vars_options: [<workspace>] [-v <varname> <varvalue> -v ...] [-f <file_values>] [--env] [--gcp <gcp_json_key>]
+#     index_options: [--refresh [--full]] [--match <pattern>] [--tag <tag>] [--tf-version <version>] [--var-key <pattern>]
+#
+
+
+import os,sys,json
+import argparse
+import fnmatch
+import atexit
+import tempfile
+import time
+from urllib.parse import urlparse,urlencode
+from . import apitrace
+from . import credentials
+from . import httpcache
+from . import ratelimit
+from . import runwatch
+from . import tfarchive
+from . import tfcasync
+from . import tfcclient
+from . import uploadconfig as uploadconf
+from . import varsync
+from . import workspaces as wsapi
+from . import wscache
+from . import wsindex
+from .lazy import lazy_import
+
+requests = lazy_import('requests')
+
+tfapi = tfcclient.tfapi
+
+# Function to build the parser of the command line arguments
+def build_parser():
+    # Global parser arguments
+    parser = argparse.ArgumentParser(prog='Terraform API CLI')
+    parser.add_argument('organization',metavar='org',help='Terraform organization')
+    parser.add_argument('--api',help='URL of the API (Terraform Enterprise, or a mock server like bench/mocktfc.py)',\
+        default=os.getenv('TFC_API',tfapi),metavar='<url>')
+    parser.add_argument('--pool-size',help='Max number of keep-alive connections to the API',type=int,\
+        default=tfcclient.default_pool_size,metavar='<connections>',dest='pool_size')
+    parser.add_argument('--timeout',help='Timeout in seconds for API responses',type=float,\
+        default=tfcclient.default_timeout,metavar='<seconds>')
+    parser.add_argument('--rate-limit',help='Max API requests per second (TFC allows 30)',type=float,\
+        default=ratelimit.default_rate,metavar='<requests>',dest='rate_limit')
+    parser.add_argument('--max-retries',help='Retries for throttled (429) or failed (5xx) API requests',type=int,\
+        default=ratelimit.default_max_retries,metavar='<retries>',dest='max_retries')
+    parser.add_argument('--id-cache-ttl',help='Seconds to keep workspace ids in the local cache (0 to disable it)',\
+        type=int,default=wscache.default_ttl,metavar='<seconds>',dest='id_cache_ttl')
+    parser.add_argument('--concurrency',help='Max API calls in flight in bulk commands (with asyncio)',type=int,\
+        default=tfcasync.default_concurrency,metavar='<calls>')
+    parser.add_argument('--no-async',help='Use threads instead of asyncio in bulk commands',action='store_true',\
+        default=False,dest='no_async')
+    parser.add_argument('--no-cache',help='Don\'t use the local cache of API responses',action='store_true',\
+        default=False,dest='no_cache')
+    parser.add_argument('--cache-ttl',help='Seconds to use cached API responses that can\'t be revalidated (ETag or '\
+        'Last-Modified)',type=int,default=httpcache.default_ttl,metavar='<seconds>',dest='cache_ttl')
+    parser.add_argument('--cache-size',help='Max size of the cache of API responses, in MB',type=int,\
+        default=httpcache.default_max_bytes // (1024 * 1024),metavar='<MB>',dest='cache_size')
+    parser.add_argument('--trace',help='Write a JSON line for every API call to a file ("-" for stderr), and print '\
+        'the latency and time of every endpoint',metavar='<file>')
+
+    subparsers = parser.add_subparsers(help='sub-command help',dest='cmd')
+
+    # Subparser for "list" menu
+    parser_list = subparsers.add_parser('list',help='listing items')
+    parser_list.add_argument('-w',help='Workspace to list',metavar='<workspace>')
+    # parser_list.add_argument('--var',help='List variables',type=bool,default='True',metavar='<True|False>')
+    parser_list.add_argument('--var',help='List variables',dest='var',action='store_true')
+    parser_list.add_argument('--page-size',help='Workspaces per page (max 100)',type=int,metavar='<size>',dest='page_size')
+    parser_list.add_argument('--workers',help='Threads to fetch pages in parallel (1 to fetch them sequentially)',\
+        type=int,default=wsapi.page_workers,metavar='<threads>')
+    parser_list.add_argument('--search',help='Workspaces with names containing a text (filtered by the API)',\
+        metavar='<text>')
+    parser_list.add_argument('--tags',help='Workspaces with all these tags (filtered by the API)',metavar='<tag>[,<tag>...]')
+    parser_list.add_argument('--match',help='Workspaces with names matching a pattern (like "prod-*")',metavar='<pattern>')
+    parser_list.add_argument('--fields',help='Workspace attributes to get and print (default only the name)',\
+        metavar='<attribute>[,<attribute>...]')
+
+    # Subparser arguments for "create" menu
+    parser_create = subparsers.add_parser('create',help='Create workspace')
+    parser_create.add_argument('workspace',help='Workspace name')
+    parser_create.add_argument('--json',help='JSON data file',type=argparse.FileType('r'),metavar='<json_file_path>')
+
+    # Subparser arguments for "delete" menu
+    parser_delete = subparsers.add_parser('delete',help='Delete workspace')
+    parser_delete.add_argument('workspace',help='Workspace name (or names, when deleting variables)',nargs='*')
+    parser_delete.add_argument('--var',help='Variables to delete',nargs='*', metavar='<var_name>')
+    parser_delete.add_argument('--var-regex',help='Delete variables with names matching a regular expression',\
+        metavar='<regex>',dest='var_regex')
+    parser_delete.add_argument('--match',help='Delete variables in all workspaces with names matching a pattern',\
+        metavar='<pattern>')
+    parser_delete.add_argument('--tag',help='Delete variables in all workspaces with a tag',metavar='<tag>')
+    parser_delete.add_argument('--workers',help='Threads to delete variables in parallel',type=int,\
+        default=varsync.default_workers,metavar='<threads>')
+    parser_delete.add_argument('--dry-run',help='Only print the variables to delete',action='store_true',default=False,\
+        dest='dry_run')
+
+    # Subparser arguments for "copy" menu
+    parser_copy = subparsers.add_parser('copy',help='Copy workspace variables')
+    parser_copy.add_argument('srcworkspace',help='Source Workspace name')
+    parser_copy.add_argument('destworkspace',help='Destination Workspace names',nargs='*')
+    parser_copy.add_argument('--match',help='Copy to all workspaces with names matching a pattern (like "prod-*")',\
+        metavar='<pattern>')
+    parser_copy.add_argument('--tag',help='Copy to all workspaces with a tag',metavar='<tag>')
+    parser_copy.add_argument('--workers',help='Threads to copy variables in parallel',type=int,\
+        default=varsync.default_workers,metavar='<threads>')
+    parser_copy.add_argument('--dry-run',help='Only print the plan of changes',action='store_true',default=False,\
+        dest='dry_run')
+
+    # Subparser arguments for "run" menu
+    parser_run = subparsers.add_parser('run',help='Run a workspace to Apply')
+    parser_run.add_argument('workspace',help='Workspace name (or names) to Apply',nargs='*')
+    parser_run.add_argument('--match',help='Run all workspaces with names matching a pattern',metavar='<pattern>')
+    parser_run.add_argument('--tag',help='Run all workspaces with a tag',metavar='<tag>')
+    parser_run.add_argument('--workers',help='Threads to create and poll the runs of many workspaces',type=int,\
+        default=runwatch.default_workers,metavar='<threads>')
+    parser_run.add_argument('--max-active',help='Max runs going on at the same time with many workspaces (0 is no limit)',\
+        type=int,default=0,dest='max_active',metavar='<runs>')
+    parser_run.add_argument('--depends',help='Run a workspace after the runs of other workspaces succeed',\
+        action='append',default=[],metavar='<workspace>=<workspace>[,<workspace>...]')
+    parser_run.add_argument('-m',help='Message for your run',metavar='<message>')
+    parser_run.add_argument('--destroy',help='Run is a destroy action',dest='destroy',action='store_true')
+    parser_run.add_argument('--auto',help='Auto-Apply the run',dest='auto',action='store_true')
+    parser_run.add_argument('--wait',help='Wait until the run is finished, and exit with its result',\
+        action='store_true',default=False)
+    parser_run.add_argument('--wait-timeout',help='Max seconds to wait for the runs (0 is no limit)',type=int,default=0,\
+        dest='wait_timeout',metavar='<seconds>')
+
+    # Subparser arguments for "vars" menu (for create variables)
+    # TODO: include a sensitive parameter --sensitive if vars are created with CLI
+    parser_var = subparsers.add_parser('vars',help='Create vars')
+    parser_var.add_argument('workspace',help='Workspace')
+    parser_var.add_argument('-v',help='Vars values',nargs=2,action='append',metavar='<var_name> <var_value>')
+    parser_var.add_argument('-f',help='File with var values',type=argparse.FileType('r'))
+    parser_var.add_argument('-tfvars',help='TFVars file with var values',type=argparse.FileType('r'))
+    parser_var.add_argument('--env',help='Environment variable',action='store_true',default=False)
+    parser_var.add_argument('--gcp',type=argparse.FileType('r'),help='GOOGLE_CREDENTIALS key JSON file',\
+        metavar='<key_file_path>')
+    parser_var.add_argument('--sensitive',help='Sensitive variable',action='store_true',default=False)
+    parser_var.add_argument('--prune',help='Delete workspace variables that are not in the input',action='store_true',\
+        default=False)
+    parser_var.add_argument('--dry-run',help='Only print the plan of changes',action='store_true',default=False,\
+        dest='dry_run')
+    parser_var.add_argument('--workers',help='Threads to apply the changes in parallel',type=int,\
+        default=varsync.default_workers,metavar='<threads>')
+
+    # Subparser arguments for "upload" menu (for create variables)
+    parser_upload = subparsers.add_parser('upload',help='upload config vars')
+    parser_upload.add_argument('workspace',help='Workspace (or workspaces)',nargs='*')
+    parser_upload.add_argument('--match',help='Upload to all workspaces with names matching a pattern',\
+        metavar='<pattern>')
+    parser_upload.add_argument('--tag',help='Upload to all workspaces with a tag',metavar='<tag>')
+    parser_upload.add_argument('--workers',help='Threads to upload to many workspaces in parallel',type=int,\
+        default=uploadconf.default_workers,metavar='<threads>')
+    parser_upload.add_argument('-d',help='Project\'s directory to upload', metavar='dir',dest='dir')
+    parser_upload.add_argument('-f',help='Write the tar.gz to this file before uploading it (by default it is streamed)',\
+        metavar='file',dest='tfcfile')
+    parser_upload.add_argument('--run',help='Set the run queue to True/False', default='true',choices=['true','false'])
+    parser_upload.add_argument('--compress-level',help='gzip compression level (1 fastest, 9 smallest)',type=int,\
+        default=tfarchive.gzip_level,choices=range(1,10),metavar='<1-9>',dest='compress_level')
+    parser_upload.add_argument('--compress-workers',help='Threads to compress the archive in parallel (0 to use all '\
+        'the cores)',type=int,default=1,metavar='<threads>',dest='compress_workers')
+    parser_upload.add_argument('--select',help='How to select a pending configuration version (default "ask" in a '\
+        'terminal, "reuse-by-hash" if not)',choices=uploadconf.select_policies)
+    parser_upload.add_argument('--force',help='Upload even if the configuration didn\'t change since the last upload',\
+        action='store_true',default=False)
+
+    # Subparser arguments for "index" menu (local index of workspaces and variables)
+    parser_index = subparsers.add_parser('index',help='Search workspaces and variables in a local index (refreshed '\
+        'from the API with --refresh)')
+    parser_index.add_argument('--refresh',help='Update the index from the API before searching (only the variables '\
+        'of the workspaces updated since the last refresh are read: variables changed in other workspaces are '\
+        'only read with --full)',action='store_true',default=False)
+    parser_index.add_argument('--full',help='With --refresh, read the variables of all the workspaces again (changing '\
+        'variables doesn\'t always change the "updated-at" of the workspace)',action='store_true',default=False)
+    parser_index.add_argument('--match',help='Workspaces with names matching a pattern (like "prod-*")',\
+        metavar='<pattern>')
+    parser_index.add_argument('--tag',help='Workspaces with a tag',metavar='<tag>')
+    parser_index.add_argument('--tf-version',help='Workspaces with a Terraform version (pattern, like "1.5.*")',\
+        metavar='<version>',dest='tf_version')
+    parser_index.add_argument('--var-key',help='Workspaces with variables matching a pattern (like "AWS_*")',\
+        metavar='<pattern>',dest='var_key')
+    parser_index.add_argument('--workers',help='Threads to read the variables in the refresh (without asyncio)',\
+        type=int,default=varsync.default_workers,metavar='<threads>')
+    return parser
+
+# Function to print the CURL command
+def curl_tfc(headers,url,method):
+    header = []
+    # for i in headers:
+    #     header.append(i)
+    print('\nCURL TFC/TFE command:')
+    print('-----------------------')
+    print('curl \\')
+    for i in headers:
+        if i == 'Authorization':
+            print('\t-H ' + '"' + i + ': Bearer $TOKEN" \\')
+        else:
+            print('\t-H ' + '"' + i + ': ' + headers[i] + '" \\')
+    print('\t-X ' + method + ' \\')
+    # Quoted, because the params of the url have "&"
+    print('\t"' + url + '"')
+    print('-----------------------')
+
+# A function to read variables from a CSV file: name,value,category,sensitive (first row is ignored)
+def var_file(varfile):
+    content = []
+    with open(varfile) as f:
+        next(f)
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            # The value can have commas, so we split the name first and the rest from the right
+            name,rest = line.split(',',1)
+            content.append([name] + rest.rsplit(',',2))
+    return content
+
+# A function to upload variables from a *.tfvars file from Terraform
+def tf_vars(tfvars):
+    file = open(tfvars, "r")
+
+    content = []
+    lines = file.readlines()
+    # print(lines)
+
+    for line in lines:
+        if line == "\n":
+            print("Skipping empty line")
+        elif line.startswith("#"):
+            print("Skipping commented line")
+        else:
+            # This is to represent (variable type),(sensitive),(hcl) for every line
+            attributes = ['terraform','false',False]
+            line = line.strip().replace(" ","")
+            line = line.split('=',1)
+            # If the value starts with '[' or '{' let's use a HCL variable value and not replace the double quotes
+            if line[1].startswith('[') or line[1].startswith('{'):
+                attributes[2] = 'true'
+            else:
+                line[1] = line[1].replace("\"","")
+
+            line.extend(attributes)
+
+
+            content.append(line)
+
+    return content
+
+# Class with what the commands share: the arguments, the token, the API client and the workspaces cache.
+# They are created when a command runs, never when importing the module
+class Context:
+    def __init__(self,args,token,api=tfapi):
+        self.args = args
+        self.token = token
+        self.api = api
+        # Shared API client (one connection pool per process) used by all the functions
+        self.client = tfcclient.TFCClient(token,api=api,pool_size=args.pool_size,timeout=args.timeout,\
+            rate_limit=args.rate_limit,max_retries=args.max_retries)
+        # Workspace name -> id cache, shared between executions. Ids getting a 404 are removed from it
+        self.cache = wscache.WorkspaceCache(scope=api,ttl=args.id_cache_ttl)
+        self.client.session.hooks['response'].append(self.cache.response_hook)
+        atexit.register(self.cache.save)
+        # Cache of the GET responses, shared between executions
+        if not args.no_cache:
+            self.client.cache = httpcache.ResponseCache(api,token,ttl=args.cache_ttl,\
+                max_bytes=args.cache_size * 1024 * 1024)
+
+    # Function to retrieve the workspace id (using the workspaces cache)
+    def workspace_id(self,organization,workspace):
+        return uploadconf.get_workspc_id(organization,workspace,self.client,self.cache)
+
+    # Function to get the ids of the workspaces of a command: {workspace_id: name,...} from the
+    # names, and from the name pattern ("--match") and tag ("--tag") if the command has them
+    def workspaces(self,organization,names):
+        found = {}
+        if getattr(self.args,'match',None) or getattr(self.args,'tag',None):
+            found.update(wsapi.find_workspaces(self.client,organization,self.args.match,self.args.tag,self.cache))
+        for name in names:
+            found[self.workspace_id(organization,name)] = name
+        return found
+
+    # The bulk commands use the asyncio client if aiohttp is installed (and "--no-async" is not used),
+    # and a pool of threads with the shared client if not
+    def use_async(self):
+        return tfcasync.available() and not self.args.no_async
+
+    def run_async(self,func,*func_args):
+        # The async client gets the same hooks of the sync client: the calls are traced and counted, and a 404
+        # of a workspace removes its id from the workspaces cache
+        return tfcasync.run(func,*func_args,token=self.token,stats_client=self.client,\
+            response_hooks=[self.cache.response_hook],api=self.api,concurrency=self.args.concurrency,\
+            timeout=self.args.timeout,rate_limit=self.args.rate_limit,max_retries=self.args.max_retries)
+
+    # Function to get the variables of many workspaces. It returns {workspace_id: (variables,error)}
+    def fetch_many(self,workspace_ids,workers=varsync.default_workers):
+        if self.use_async():
+            return self.run_async(varsync.fetch_many_async,workspace_ids)
+        return varsync.fetch_many(self.client,workspace_ids,workers)
+
+    # Function to apply the variable plans of many workspaces [(workspace_id,plan),...]
+    def apply_plans(self,plans,workers=varsync.default_workers):
+        if self.use_async():
+            return self.run_async(varsync.apply_plans_async,plans)
+        return varsync.apply_plans(self.client,plans,workers)
+
+    # Function to copy the variables of a workspace to many workspaces ({workspace_id: name,...})
+    # Source variables are read once, and the destinations are updated in parallel. Variables that
+    # already exist in a destination are updated instead of failing
+    def copy_vars(self,source_wksp_id,destinations,workers=varsync.default_workers,dry_run=False):
+        source = wsapi.get_variables(self.client,source_wksp_id)
+        curl_tfc(self.client.headers,self.client.url('/workspaces/' + source_wksp_id + '/vars'),'GET')
+        plans = []
+        errors = 0
+        for wid,(existing,error) in self.fetch_many(destinations,workers).items():
+            if error:
+                print('Cannot read variables of "' + destinations[wid] + '": ' + error)
+                errors += 1
+                continue
+            plan = varsync.plan_copy(existing,source)
+            varsync.print_plan(plan,destinations[wid])
+            plans.append((wid,plan))
+        if dry_run:
+            print('Dry run: no changes applied')
+            return errors
+        return errors + varsync.print_summary(destinations,plans,self.apply_plans(plans,workers))
+
+# Function to run a command. It returns the exit code
+def run_command(ctx):
+    args = ctx.args
+    client = ctx.client
+    org = args.organization
+    exit_code = 0
+    if args.cmd == 'list':
+        if args.w:
+            # The workspace details already have the id, so we don't need another call to resolve it
+            wlist = wsapi.getlist(client,org,wname=args.w)
+            curl_tfc(client.headers,client.url('/organizations/' + org + '/workspaces/' + args.w),'GET')
+            wid = wlist[0]['id']
+            ctx.cache.set(org,args.w,wid)
+            print(wid)
+            print(json.dumps(wlist,indent=2))
+            if args.var:
+                wvars = wsapi.get_variables(client,wid)
+                curl_tfc(client.headers,client.url('/workspaces/' + wid + '/vars'),'GET')
+                print('\nList of variables for workspace \"' + args.w + '\" is:')
+                for i in wvars:
+                    print('Name: ' + i.key,'--','Type: ' + i.category,'--','id: ' + i.id)
+        else:
+            # Workspaces are printed while the next pages are still being fetched. Only the attributes that
+            # are printed are requested, and the API filters the workspaces as much as it can
+            fields = ['name'] + [f for f in (args.fields or '').split(',') if f and f != 'name']
+            search = args.search or wsapi.glob_search(args.match)
+            tags = args.tags.split(',') if args.tags else None
+            print('\nSummary list of names and ids:')
+            for i in wsapi.iter_workspaces(client,org,args.page_size,args.workers,search,tags,fields):
+                name = i['attributes']['name']
+                if args.match and not fnmatch.fnmatchcase(name,args.match):
+                    continue
+                print('Workspace: ' + name + ' --- id: ' + i['id'] + ''.join(' --- ' + f + ': ' +\
+                    json.dumps(i['attributes'].get(f)) for f in fields[1:]))
+            curl_tfc(client.headers,client.url('/organizations/' + org + '/workspaces/?' +\
+                urlencode(wsapi.list_params(search,tags,fields))),'GET')
+
+    if args.cmd == 'create':
+        payload = None
+        if args.json:
+            payload = json.load(args.json)
+            print(json.dumps(payload,indent=2))
+        print(json.dumps(wsapi.create_workspace(client,org,args.workspace,payload,ctx.cache),indent=2))
+
+    if args.cmd == 'delete':
+        if args.var is not None or args.var_regex:
+            workspaces = ctx.workspaces(org,args.workspace)
+            # Let's get the variables of all the workspaces, and delete the selected ones in parallel
+            plans = []
+            errors = 0
+            for wid,(existing,error) in ctx.fetch_many(workspaces,args.workers).items():
+                if error:
+                    print('Cannot read variables of "' + workspaces[wid] + '": ' + error)
+                    errors += 1
+                    continue
+                plan = varsync.plan_delete(existing,args.var,args.var_regex)
+                varsync.print_plan(plan,workspaces[wid])
+                plans.append((wid,plan))
+            if args.dry_run:
+                print('Dry run: no changes applied')
+            else:
+                results = ctx.apply_plans(plans,args.workers)
+                varsync.print_outcomes(workspaces,results)
+                errors += varsync.print_summary(workspaces,plans,results)
+            if errors > 0:
+                raise SystemExit('Some variables could not be deleted')
+        else:
+            if len(args.workspace) != 1:
+                raise SystemExit('Only one workspace can be deleted at a time')
+            wid = ctx.workspace_id(org,args.workspace[0])
+            confirm_delete = input("Are you sure to delete worskpace \"%s\"? (y/N) " % wid)
+            if confirm_delete[:1] == "y" :
+                print("delete")
+                wsapi.delete_workspace(client,wid,ctx.cache)
+                print(wid + ' deleted...')
+                curl_tfc(client.headers,client.url('/workspaces/' + wid),'DELETE')
+            else:
+                print("Exiting...")
+                raise SystemExit()
+
+    if args.cmd == 'vars':
+        wid = ctx.workspace_id(org,args.workspace)
+        # Let's collect all the variables that we want in the workspace, and compare them with the existing ones
+        desired = []
+        if args.v:
+            if args.env is True:
+                env = 'env'
+            else:
+                env = 'terraform'
+            for item in args.v:
+                name,value = item[0],item[1]
+                desired.append(varsync.new_var(name,value,env,sensitive=args.sensitive))
+
+        if args.f:
+            print(args.f.name)
+            for item in var_file(args.f.name):
+                name,value,env,sensitive = item[0],item[1],item[2],item[3]
+                desired.append(varsync.new_var(name,value,env,sensitive=sensitive))
+
+        if args.tfvars:
+            content = tf_vars(args.tfvars.name)
+            for item in content:
+                name,value,env,sensitive = item[0],item[1],item[2],item[3]
+                desired.append(varsync.new_var(name,value,env,hcl=item[4],sensitive=sensitive))
+
+        if args.gcp:
+            credsfile = json.dumps(json.load(args.gcp))
+            desired.append(varsync.new_var('GOOGLE_CREDENTIALS',str(credsfile),'env',sensitive=True))
+
+        plan = varsync.plan_vars(wsapi.get_variables(client,wid),desired,prune=args.prune)
+        curl_tfc(client.headers,client.url('/workspaces/' + wid + '/vars'),'GET')
+        varsync.print_plan(plan,args.workspace)
+        if args.dry_run:
+            print('Dry run: no changes applied')
+        elif varsync.print_results([i[1:] for i in ctx.apply_plans([(wid,plan)],args.workers)]) > 0:
+            raise SystemExit('Some variables could not be applied')
+
+    if args.cmd == 'upload':
+        if args.dir:
+            tardir = args.dir
+        else:
+            tardir = os.getcwd()
+        # If using '-f' parameter we write the tar.gz to that file, if not the archive is streamed to TFC
+        tfcfile = args.tfcfile
+        # Never wait for an answer if there's nobody to answer (CI pipelines)
+        if args.select is None:
+            args.select = 'ask' if sys.stdin.isatty() else 'reuse-by-hash'
+        if args.compress_workers == 0:
+            args.compress_workers = None
+        workspaces = ctx.workspaces(org,args.workspace)
+        if not workspaces:
+            raise SystemExit('There are no workspaces to upload the configuration to')
+
+        # Archives are deterministic, so if the content hash is the same as the last upload there's nothing to do
+        stats = tfarchive.new_stats()
+        digest = uploadconf.config_hash(tardir,stats)
+        uploadconf.print_stats(stats)
+        print('Configuration hash: ' + digest)
+
+    if args.cmd == 'upload' and len(workspaces) > 1:
+        # The archive is created only once (in a temporary file if there is no '-f') and uploaded to all the workspaces
+        if tfcfile:
+            upfile,archived = uploadconf.create_upload(tardir,tfcfile,level=args.compress_level,\
+                workers=args.compress_workers)
+        else:
+            fd,upfile = tempfile.mkstemp(prefix='tfc-upload-',suffix='.tar.gz')
+            os.close(fd)
+            upfile,archived = uploadconf.create_upload(tardir,upfile,level=args.compress_level,\
+                workers=args.compress_workers)
+        digest = uploadconf.archived_hash(digest,archived)
+        try:
+            print('Uploading ' + upfile + ' to ' + str(len(workspaces)) + ' workspaces')
+            results = uploadconf.upload_many(workspaces,upfile,digest,args.run,client,args.workers,args.force,\
+                args.select)
+        finally:
+            if not tfcfile:
+                os.remove(upfile)
+        if uploadconf.print_uploads(results) > 0:
+            raise SystemExit('The configuration could not be uploaded to some workspaces')
+
+    elif args.cmd == 'upload':
+        wid = list(workspaces)[0]
+        print(wid)
+        status,config = (None,None) if args.force else uploadconf.uploaded_config(wid,digest,client,args.run)
+        if status == 'uploaded':
+            print('Configuration is unchanged and already uploaded as ' + config['id'] + '. Skipping upload')
+        else:
+            if tfcfile:
+                upfile,archived = uploadconf.create_upload(tardir,tfcfile,level=args.compress_level,\
+                    workers=args.compress_workers)
+                print(upfile)
+                digest = uploadconf.archived_hash(digest,archived)
+            if status == 'pending' and args.select != 'always-new':
+                print('Reusing pending configuration version ' + config['id'] + ' with the same content')
+                config_id,upconf = config['id'],config['attributes']['upload-url']
+            else:
+                # Now creating the configuration (or reusing a pending one, depending on the selection policy)
+                config = uploadconf.find_config(wid,client,args.select,digest,args.run)
+                if config is None:
+                    config = uploadconf.create_config_version(wid,args.run,client)
+                config_id,upconf = config['id'],config['attributes']['upload-url']
+
+            print('The url to upload configuration is: \n' + upconf)
+            uploadconf.record_upload(wid,digest,config_id,done=False)
+
+            # Upload the configuration content
+            if tfcfile:
+                uploadconf.upload_conf(upfile,upconf,client)
+            else:
+                stream = uploadconf.create_stream(tardir,args.compress_level,args.compress_workers)
+                uploadconf.upload_stream(stream,upconf,client)
+                print('Streamed ' + str(stream.bytes) + ' bytes of configuration')
+                # The stream is archived while it's uploaded, so its hash is only known now
+                digest = uploadconf.archived_hash(digest,stream.digest)
+            uploadconf.record_upload(wid,digest,config_id)
+
+    if args.cmd == 'copy':
+        src_id = ctx.workspace_id(org,args.srcworkspace)
+        destinations = ctx.workspaces(org,args.destworkspace)
+        # The source is never a destination
+        destinations.pop(src_id,None)
+        if not destinations:
+            raise SystemExit('There are no destination workspaces to copy variables to')
+        print('Copying variables from "' + args.srcworkspace + '" to ' + str(len(destinations)) + ' workspaces')
+        if ctx.copy_vars(src_id,destinations,args.workers,args.dry_run) > 0:
+            raise SystemExit('Some variables could not be copied')
+
+    if args.cmd == 'index':
+        with wsindex.WorkspaceIndex(scope=ctx.api) as index:
+            if args.refresh:
+                counters = index.refresh(client,org,lambda ids: ctx.fetch_many(ids,args.workers),args.full,\
+                    cache=ctx.cache)
+                print('Index refreshed: %d workspaces (%d new, %d removed), variables read from %d workspaces' %\
+                    (counters['workspaces'],counters['added'],counters['removed'],counters['vars_read']))
+                for name,error in counters['errors'].items():
+                    print('  ' + name + ': cannot read variables: ' + error)
+                if not args.full:
+                    print('Variables changed in workspaces not updated since the last refresh are not read, use --full '\
+                        'to read all of them')
+                if counters['errors']:
+                    exit_code = 1
+            refreshed = index.refreshed_at(org)
+            if refreshed is None:
+                print('The index of "' + org + '" is empty, use --refresh to read it from the API')
+                return 1
+            found = index.search(org,args.match,args.tag,args.tf_version,args.var_key)
+            for i in found:
+                print('Workspace: ' + i['name'] + ' --- id: ' + i['id'] + ' --- terraform: ' +\
+                    str(i['terraform_version']) + ' --- tags: ' + ','.join(i['tags']))
+                if args.var_key:
+                    for v in i['vars']:
+                        print('    ' + v['key'] + ' (' + v['category'] + (', sensitive' if v['sensitive'] else '') + ')')
+            print('%d workspaces found (index refreshed at %s)' % (len(found),\
+                time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(refreshed))))
+
+    if args.cmd == 'run':
+        if args.m:
+            message = args.m
+        else:
+            message = 'Run from TFCPy'
+        workspaces = ctx.workspaces(org,args.workspace)
+        if not workspaces:
+            raise SystemExit('There are no workspaces to run')
+        # Dependencies are "<workspace>=<workspace>,<workspace>": the first one runs after the others
+        depends = {}
+        for i in args.depends:
+            name,_,deps = i.partition('=')
+            depends.setdefault(name,[]).extend(d for d in deps.split(',') if d)
+
+    if args.cmd == 'run' and (len(workspaces) > 1 or depends):
+        if args.destroy is True:
+            message = 'Destroying... ' + message
+        print('Running ' + str(len(workspaces)) + ' workspaces')
+        try:
+            watches = runwatch.run_many(client,workspaces,message,args.destroy,args.auto,args.workers,\
+                args.max_active,depends,args.wait_timeout,runwatch.print_progress)
+        except ValueError as err:
+            raise SystemExit(err)
+        runwatch.print_runs(watches)
+        exit_code = runwatch.batch_exit_code(watches)
+
+    elif args.cmd == 'run':
+        wid = list(workspaces)[0]
+        name = workspaces[wid]
+        running = wsapi.run_workspace(client,wid,message,args.destroy,args.auto)
+        runid = running['data']['id']
+        print('\n============================')
+        print('Run ID: ' + runid )
+        print('Plan Endpoint: https://app.terraform.io' + running['data']['relationships']['plan']['links']['related'])
+        print('Run URL: https://app.terraform.io/app/' + args.organization + '/workspaces/' + \
+            name + '/runs/' + runid)
+        if args.wait:
+            print('\nWaiting for run ' + runid + ':')
+            watch = runwatch.wait_run(client,runid,args.wait_timeout,runwatch.print_change,running['data'])
+            runwatch.print_result(watch)
+            exit_code = watch.exit_code()
+
+    return exit_code
+
+# Fun starts here
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    # Let's ouput the arguments selected
+    print('Parameters selected: ' + str(args))
+    if args.cmd is None:
+        parser.print_help()
+        return
+
+    token,source = credentials.load_token(urlparse(args.api).hostname)
+    # Searching the local index doesn't need the API
+    offline = args.cmd == 'index' and not args.refresh
+    if token is None and not offline:
+        print("Cannot find Terraform API token in TOKEN env variable or in " + credentials.tfcredsfile + ".")
+        raise SystemExit('Exit')
+    if source == 'env':
+        print("Using Terraform API token defined in environment variable.")
+    elif source is not None:
+        print("Using Terraform API token from \"" + source + "\".")
+
+    ctx = Context(args,token or '',args.api.rstrip('/'))
+    tracer = None
+    if args.trace:
+        tracer = apitrace.Tracer(sys.stderr if args.trace == '-' else open(args.trace,'w'))
+        ctx.client.hooks.append(tracer)
+    try:
+        exit_code = run_command(ctx)
+    except requests.exceptions.HTTPError as err:
+        print(err.response.url)
+        print(err.response.text)
+        raise SystemExit(err)
+    except requests.exceptions.RequestException as err:
+        # Connection errors and timeouts that are still failing after the retries
+        raise SystemExit('API request failed: ' + str(err))
+    finally:
+        ctx.client.close()
+        if ctx.client.cache is not None:
+            ctx.client.cache.close()
+        if tracer is not None:
+            tracer.print_summary()
+            if tracer.output is not sys.stderr:
+                tracer.output.close()
+
+    print('API requests: %d (retries: %d, throttled: %.2fs, waiting retries: %.2fs)' % (ctx.client.stats['requests'],\
+        ctx.client.stats['retries'],ctx.client.stats['throttled'],ctx.client.stats['retry_wait']))
+    if ctx.client.cache is not None and (ctx.client.cache.stats['hits'] or ctx.client.cache.stats['revalidated']):
+        print('Cached API responses: %d used without a request, %d revalidated (304)' % (ctx.client.cache.stats['hits'],\
+            ctx.client.cache.stats['revalidated']))
+    print('\n======\n')
+    if exit_code:
+        raise SystemExit(exit_code)
@@ -0,0 +1,29 @@
+# Python module to find the Terraform Cloud API token
+# The token is taken from the TOKEN environment variable, or from the credentials file written by
+# "terraform login" (~/.terraform.d/credentials.tfrc.json). Nothing is read until load_token is called.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import credentials
+#   token,source = credentials.load_token()
+
+
+import os,json
+
+tfcredsfile = os.path.join(os.path.expanduser('~'),'.terraform.d','credentials.tfrc.json')
+default_host = 'app.terraform.io'
+
+# Function to get the token and where it was found: (token,'env') or (token,<credentials file>).
+# It returns (None,None) if there is no token
+def load_token(host=default_host,path=tfcredsfile,env='TOKEN'):
+    token = os.getenv(env)
+    if token:
+        return (token,'env')
+    if os.path.exists(path):
+        with open(path) as creds:
+            tfconf = json.load(creds)
+        token = tfconf.get('credentials',{}).get(host,{}).get('token')
+        if token:
+            return (token,path)
+    return (None,None)
@@ -0,0 +1,166 @@
+# Python module with a cache of the API GET responses, shared between executions of the scripts
+# The responses are saved (by default in ~/.cache/tfc-python/responses.sqlite) with their ETag and
+# Last-Modified headers. The next GET of the same url is sent with If-None-Match/If-Modified-Since, and
+# a 304 answer is served from the cache. Responses without those headers are served from the cache for a
+# short TTL. The cache has a size limit, evicting the least recently used responses.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import httpcache
+#   client.cache = httpcache.ResponseCache(client.api,token)
+#
+# The keys are scoped by API url and token (hashed, the token is not saved). Any change done with the
+# API (POST, PATCH, PUT, DELETE) removes the responses of the scope, and the status of runs, plans,
+# applies and configuration versions (that change by themselves) is never cached.
+
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from .lazy import lazy_import
+from .wscache import cache_dir
+
+sqlite3 = lazy_import('sqlite3')
+
+cache_path = os.path.join(cache_dir,'responses.sqlite')
+default_ttl = 30
+default_max_bytes = 50 * 1024 * 1024
+
+# Urls whose content changes without API calls from us, so they are never cached
+volatile = re.compile(r'/(runs|plans|applies|configuration-versions)(/|\?|$)')
+
+# Response headers saved with the body
+saved_headers = ('Content-Type','ETag','Last-Modified')
+
+schema = '''
+create table if not exists responses (
+    scope text not null, url text not null, status integer, headers text, body blob, size integer,
+    etag text, last_modified text, stored_at real, used_at real,
+    primary key (scope,url));
+create index if not exists responses_used on responses (used_at);
+'''
+
+# Cached response: the body and headers, and the validators to revalidate it
+class Entry:
+    def __init__(self,url,status,headers,body,etag,last_modified,stored_at):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+
+    # Responses with ETag or Last-Modified are always revalidated, the rest are used until they expire
+    def fresh(self,ttl):
+        return not self.validators() and time.time() - self.stored_at < ttl
+
+    def validators(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class ResponseCache:
+    def __init__(self,api,token,ttl=default_ttl,max_bytes=default_max_bytes,path=cache_path):
+        self.api = api.rstrip('/')
+        self.scope = hashlib.sha256((self.api + '|' + token).encode()).hexdigest()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.path = path
+        # Counters of the cache: responses served without a request (hits), after a 304 (revalidated),
+        # and saved (stored)
+        self.stats = {'hits': 0, 'revalidated': 0, 'stored': 0}
+        self.lock = threading.Lock()
+        self.db = None
+        # Size of the responses in the file (approximate: other executions can be writing too)
+        self.total = 0
+        # True when the responses of the scope were removed, and nothing was saved after that
+        self.clean = False
+
+    # The database is opened on first use, by any thread (the lock serializes the access)
+    def connect(self):
+        if self.db is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path),exist_ok=True)
+                # The bodies can have variable values, so only the user can read the file
+                os.close(os.open(self.path,os.O_CREAT | os.O_WRONLY,0o600))
+            self.db = sqlite3.connect(self.path,timeout=10,check_same_thread=False)
+            # It's a cache: losing the last writes in a crash is better than waiting for the disk in every write
+            self.db.execute('pragma journal_mode=wal')
+            self.db.execute('pragma synchronous=off')
+            self.db.executescript(schema)
+            self.total = self.db.execute('select coalesce(sum(size),0) from responses').fetchone()[0]
+        return self.db
+
+    # Function to know if the response of a GET url can be cached
+    def cacheable(self,url):
+        return url.startswith(self.api) and not volatile.search(url[len(self.api):])
+
+    def get(self,url):
+        with self.lock:
+            row = self.connect().execute('select status,headers,body,etag,last_modified,stored_at from responses '\
+                'where scope = ? and url = ?',(self.scope,url)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('update responses set used_at = ? where scope = ? and url = ?',(time.time(),self.scope,url))
+            self.db.commit()
+        return Entry(url,row[0],json.loads(row[1]),row[2],row[3],row[4],row[5])
+
+    # Function to save a response (status 200). Responses bigger than the cache are not saved
+    def put(self,url,status,headers,body):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if len(body) > self.max_bytes or (not etag and not last_modified and self.ttl <= 0):
+            return
+        now = time.time()
+        with self.lock:
+            db = self.connect()
+            db.execute('insert or replace into responses (scope,url,status,headers,body,size,etag,last_modified,'\
+                'stored_at,used_at) values (?,?,?,?,?,?,?,?,?,?)',(self.scope,url,status,\
+                json.dumps({k: headers[k] for k in saved_headers if k in headers}),body,len(body),etag,\
+                last_modified,now,now))
+            self.total += len(body)
+            self.clean = False
+            if self.total > self.max_bytes:
+                self.evict()
+            db.commit()
+            self.stats['stored'] += 1
+
+    # Function to remove the least recently used responses until the cache is under its size limit
+    def evict(self):
+        self.total = self.db.execute('select coalesce(sum(size),0) from responses').fetchone()[0]
+        if self.total <= self.max_bytes:
+            return
+        for url,scope,size in self.db.execute('select url,scope,size from responses order by used_at').fetchall():
+            self.db.execute('delete from responses where scope = ? and url = ?',(scope,url))
+            self.total -= size
+            if self.total <= self.max_bytes:
+                break
+
+    # Function to remove all the responses of the scope, after a change done with the API.
+    # Many changes in a row (like in bulk commands) only remove them once
+    def invalidate(self):
+        with self.lock:
+            if self.clean or (self.db is None and not os.path.exists(self.path)):
+                return
+            self.connect().execute('delete from responses where scope = ?',(self.scope,))
+            self.db.commit()
+            self.total = self.db.execute('select coalesce(sum(size),0) from responses').fetchone()[0]
+            self.clean = True
+
+    def count(self,name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,52 @@
+# Python module to decode and encode the JSON:API documents of Terraform Cloud
+# The body of every response is decoded only once (document), with orjson if it's installed (much faster
+# with big lists of workspaces) and with the json module of the standard library if not. The items of the
+# lists can be projected to compact records with only the id and the attributes that a command needs.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import jsonapi
+#   doc = jsonapi.document(r)
+#   workspaces = [jsonapi.project(i,['name']) for i in doc['data']]
+
+
+import json
+from .lazy import installed,lazy_import
+
+# orjson is optional
+orjson = lazy_import('orjson') if installed('orjson') else None
+
+# Function to know the JSON backend used
+def backend():
+    return 'orjson' if orjson is not None else 'json'
+
+# Function to decode a JSON body (bytes or str)
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Function to encode a payload to send it (bytes)
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode()
+
+# Function to get the decoded body of a response (requests, or the responses of the tfcasync and tfcclient
+# modules). It's decoded the first time, and kept in the response for the next calls
+def document(r):
+    try:
+        return r._document
+    except AttributeError:
+        r._document = loads(r.content)
+        return r._document
+
+# Function to project an item of a JSON:API document to a compact record: the same shape (so it's used
+# like the item), but only with the id, the type and the "fields" attributes (all of them if None)
+def project(item,fields=None):
+    if fields is None:
+        return item
+    attributes = item.get('attributes') or {}
+    return {'id': item.get('id'), 'type': item.get('type'), 'attributes': {k: attributes[k] for k in fields\
+        if k in attributes}}
@@ -0,0 +1,40 @@
+# Python module to import modules lazily
+# The heavy modules (requests, asyncio, aiohttp) are only loaded the first time one of their attributes
+# is used, so importing tfcpy (or running "pytfc.py --help") doesn't pay for them.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy.lazy import lazy_import
+#   requests = lazy_import('requests')
+
+
+import sys
+import types
+import importlib
+import importlib.util
+
+# Function to know if a module can be imported, without importing it
+def installed(name):
+    return name in sys.modules or importlib.util.find_spec(name) is not None
+
+# Module that imports the real one the first time one of its attributes is used. The import is done with
+# importlib.import_module, so the threads using it at the same time wait until it's fully imported
+# (importlib.util.LazyLoader is not thread safe before Python 3.12: other threads can see a half
+# imported module)
+class LazyModule(types.ModuleType):
+    def __getattr__(self,attribute):
+        module = importlib.import_module(self.__name__)
+        # The attributes are copied, so the next uses don't come here
+        self.__dict__.update(module.__dict__)
+        return getattr(module,attribute)
+
+# Function to get a module that is loaded when it's used.
+# If the module is already imported it's returned as it is
+def lazy_import(name):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    if importlib.util.find_spec(name) is None:
+        raise ImportError('No module named ' + repr(name),name=name)
+    return LazyModule(name)
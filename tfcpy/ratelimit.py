@@ -0,0 +1,94 @@
+# Python module to keep the API calls under the Terraform Cloud rate limit
+# TFC allows 30 requests per second per token and answers with a 429 (and a Retry-After header)
+# when the limit is exceeded: https://www.terraform.io/docs/cloud/api/index.html#rate-limiting
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import ratelimit
+#   bucket = ratelimit.TokenBucket(rate=30)
+#   bucket.acquire()    # Waits (if needed) before doing a request
+
+
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+default_rate = 30
+default_max_retries = 5
+# Backoff times in seconds for retries: base * 2^attempt (with jitter), never more than max
+backoff_base = 0.5
+backoff_max = 30
+
+# Status codes that are worth retrying. 429 means the request was not processed, so it can be
+# retried for any method, but 5xx errors are only retried for methods that are safe to repeat
+retry_status = (429,500,502,503,504)
+idempotent_methods = ('GET','HEAD','PUT','PATCH','DELETE','OPTIONS')
+
+# Token bucket shared by all the threads of a client. It refills "rate" tokens per second and
+# allows bursts of up to "burst" requests. Every request takes a token, and when there are no
+# tokens left the request waits for its turn.
+class TokenBucket:
+    def __init__(self,rate=default_rate,burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        # Time until all requests are paused (after a 429 with Retry-After)
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    # Takes a token and returns the seconds to wait until it's available (without waiting),
+    # so asyncio code can wait for its turn with asyncio.sleep
+    def reserve(self):
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst,self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # The token is reserved now, even if we have to wait for it, so waiting threads keep their turn
+            self.tokens -= 1
+            return max(0.0,-self.tokens / self.rate,self.paused_until - now)
+
+    # Takes a token and waits until it's available. Returns the seconds waited
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    # Stops all the requests of the bucket for some seconds
+    def pause(self,seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until,time.monotonic() + seconds)
+            self.tokens = min(self.tokens,0.0)
+
+# Function to get the seconds to wait from a 429/503 response (Retry-After or X-RateLimit-Reset)
+def retry_after(response):
+    value = response.headers.get('Retry-After')
+    if value:
+        try:
+            return max(0.0,float(value))
+        except ValueError:
+            try:
+                return max(0.0,parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError,ValueError):
+                pass
+    value = response.headers.get('X-RateLimit-Reset')
+    if value:
+        try:
+            return max(0.0,float(value))
+        except ValueError:
+            pass
+    return None
+
+# Function to calculate the wait before a retry: exponential backoff with "full jitter"
+def backoff(attempt):
+    return random.uniform(0,min(backoff_max,backoff_base * 2 ** attempt))
+
+def should_retry(method,status):
+    if status == 429:
+        return True
+    return status in retry_status and method.upper() in idempotent_methods
@@ -0,0 +1,122 @@
+# Python module with compact records for the workspaces, variables and runs of Terraform Cloud
+# The API items are nested dicts (id, type, attributes, relationships...) with many attributes that the
+# commands don't use. The records keep only the fields that are used, in __slots__ (no dict per object),
+# so the variables of a whole organization take a fraction of the memory. Records are not changed once
+# created (replace returns a new one), and every to_payload call builds a new payload, so they can be
+# shared by many threads or coroutines.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import records
+#   variables = [records.Variable.from_api(i) for i in workspaces.iter_vars(client,workspace_id)]
+#   new = records.Variable(key='region',value='eu-west-1',category='env')
+#   client.post('/workspaces/' + workspace_id + '/vars',json=new.to_payload())
+
+
+# Base class of the records: fields in __slots__, keyword arguments, equality and repr by fields
+class Record:
+    __slots__ = ()
+    # Values of the fields that are not passed (None if they are not here)
+    defaults = {}
+
+    def __init__(self,**kwargs):
+        for name in self.__slots__:
+            setattr(self,name,kwargs.pop(name,self.defaults.get(name)))
+        if kwargs:
+            raise TypeError(type(self).__name__ + ' has no fields ' + ', '.join(sorted(kwargs)))
+
+    # Function to get a new record with some fields changed
+    def replace(self,**changes):
+        fields = self.fields()
+        fields.update(changes)
+        return type(self)(**fields)
+
+    def fields(self):
+        return {name: getattr(self,name) for name in self.__slots__}
+
+    def __eq__(self,other):
+        return type(other) is type(self) and self.fields() == other.fields()
+
+    def __repr__(self):
+        return type(self).__name__ + '(' + ', '.join(name + '=' + repr(getattr(self,name))\
+            for name in self.__slots__) + ')'
+
+# Workspace with the attributes used to find and index workspaces
+class Workspace(Record):
+    __slots__ = ('id','name','terraform_version','updated_at','tags')
+    defaults = {'tags': ()}
+
+    @classmethod
+    def from_api(cls,item):
+        attributes = item.get('attributes') or {}
+        return cls(id=item.get('id'),name=attributes.get('name'),\
+            terraform_version=attributes.get('terraform-version'),updated_at=attributes.get('updated-at'),\
+            tags=tuple(attributes.get('tag-names') or ()))
+
+# Variable of a workspace. A "description" of None is not sent, so the one in the workspace is kept
+class Variable(Record):
+    __slots__ = ('id','key','value','category','hcl','sensitive','description')
+    defaults = {'category': 'terraform', 'hcl': False, 'sensitive': False}
+
+    @classmethod
+    def from_api(cls,item):
+        attributes = item.get('attributes') or {}
+        return cls(id=item.get('id'),key=attributes.get('key'),value=attributes.get('value'),\
+            category=attributes.get('category','terraform'),hcl=bool(attributes.get('hcl')),\
+            sensitive=bool(attributes.get('sensitive')),description=attributes.get('description'))
+
+    # Function to get the attributes of the variable, as the API names them
+    def attributes(self):
+        attributes = {'key': self.key, 'value': self.value, 'category': self.category, 'hcl': self.hcl,\
+            'sensitive': self.sensitive}
+        if self.description is not None:
+            attributes['description'] = self.description
+        return attributes
+
+    # Function to build the payload to create the variable, or to update it (with its id) if "update" is True
+    def to_payload(self,update=False):
+        payload = {
+            "data": {
+                "type": "vars",
+                "attributes": self.attributes()
+            }
+        }
+        if update and self.id:
+            payload['data']['id'] = self.id
+        return payload
+
+# Run of a workspace, with the status and the attributes needed to know if it's waiting for somebody
+class Run(Record):
+    __slots__ = ('id','workspace_id','status','message','is_destroy','auto_apply','is_confirmable')
+    defaults = {'is_destroy': False, 'auto_apply': False, 'is_confirmable': True}
+
+    @classmethod
+    def from_api(cls,item):
+        attributes = item.get('attributes') or {}
+        workspace = ((item.get('relationships') or {}).get('workspace') or {}).get('data') or {}
+        return cls(id=item.get('id'),workspace_id=workspace.get('id'),status=attributes.get('status'),\
+            message=attributes.get('message'),is_destroy=bool(attributes.get('is-destroy')),\
+            auto_apply=bool(attributes.get('auto-apply')),\
+            is_confirmable=(attributes.get('actions') or {}).get('is-confirmable',True))
+
+    # Function to build the payload to create the run
+    def to_payload(self):
+        return {
+            "data": {
+                "attributes": {
+                    "message": self.message,
+                    "is-destroy": self.is_destroy,
+                    "auto-apply": self.auto_apply
+                },
+                "type":"runs",
+                "relationships": {
+                    "workspace": {
+                        "data": {
+                            "type": "workspaces",
+                            "id": self.workspace_id
+                        }
+                    }
+                }
+            }
+        }
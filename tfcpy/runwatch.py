@@ -0,0 +1,334 @@
+# Python module to wait for Terraform Cloud runs until they finish
+# The run is polled in the same process (with the kept-alive connections of the client), more often
+# while TFC is working on it (planning, applying...) and less often while it's waiting in a queue.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import runwatch
+#   watch = runwatch.wait_run(client,run_id,timeout=3600)
+#   print(watch.status,watch.polls,watch.elapsed())
+#   sys.exit(watch.exit_code())
+#
+#   watches = runwatch.run_many(client,{workspace_id: name,...},'message',depends={name: [name,...]})
+
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import jsonapi
+from . import records
+from .lazy import lazy_import
+
+requests = lazy_import('requests')
+
+# Run states: https://www.terraform.io/docs/cloud/api/run.html#run-states
+final_states = ('applied','planned_and_finished','errored','discarded','canceled','force_canceled')
+# States where the run doesn't continue until somebody confirms it (if it's not auto-applied)
+confirm_states = ('planned','cost_estimated','policy_checked','post_plan_completed')
+# States where the run doesn't continue until somebody overrides a policy
+override_states = ('policy_override','policy_soft_failed')
+# States where TFC is working on the run, so the status is going to change soon. The rest (pending,
+# plan_queued, queuing, apply_queued, queuing_apply...) are waiting in a queue, and are polled less often
+active_states = ('fetching','fetching_completed','pre_plan_running','pre_plan_completed','planning',\
+    'cost_estimating','policy_checking','post_plan_running','confirmed','pre_apply_running','pre_apply_completed',\
+    'applying','post_apply_running')
+
+# Exit codes for the final status of the runs
+exit_codes = {'applied': 0, 'planned_and_finished': 0, 'errored': 1, 'discarded': 2, 'canceled': 2, 'force_canceled': 2}
+exit_needs_confirm = 3
+exit_timeout = 4
+
+# Threads for the API calls of many runs (creating and polling them)
+default_workers = 8
+
+# Seconds between polls: (first interval, max interval). The interval starts again when the status
+# changes, and grows by "backoff_factor" with every poll that gets the same status
+active_interval = (1.0,5.0)
+queued_interval = (2.0,15.0)
+backoff_factor = 1.5
+
+# Function to know why a run (records.Run) is not going to change anymore: 'final', 'confirm' or None if
+# it's still going on
+def stop_reason(run):
+    if run.status in final_states:
+        return 'final'
+    if run.status in override_states:
+        return 'confirm'
+    if run.status in confirm_states and not run.auto_apply:
+        # If the API says the run is not confirmable yet (some task is still running) we keep waiting
+        if run.is_confirmable:
+            return 'confirm'
+    return None
+
+# Class with the polling state of a run
+class RunWatch:
+    def __init__(self,run_id,name=None):
+        self.id = run_id
+        self.name = name or run_id
+        self.run = None
+        self.status = None
+        self.polls = 0
+        self.interval = 0.0
+        self.started = time.monotonic()
+        # Monotonic time of the next poll, and of the end of the run
+        self.due = self.started
+        self.finished = None
+        self.timed_out = False
+        # Message if the run could not be created or polled, or if it was skipped
+        self.error = None
+        self.skipped = False
+
+    # Updates the status with the run data from the API (only a record of it is kept, not the whole
+    # document). Returns True if the status changed
+    def update(self,run):
+        self.run = records.Run.from_api(run)
+        status = self.run.status
+        changed = status != self.status
+        self.status = status
+        first,limit = active_interval if status in active_states else queued_interval
+        self.interval = first if changed else min(limit,self.interval * backoff_factor)
+        now = time.monotonic()
+        self.due = now + self.interval
+        if self.done() and self.finished is None:
+            self.finished = now
+        return changed
+
+    def done(self):
+        if self.error is not None or self.timed_out:
+            return True
+        return self.run is not None and stop_reason(self.run) is not None
+
+    # Stops watching the run because of an error (or because it's skipped)
+    def fail(self,message,skipped=False):
+        self.error = message
+        self.skipped = skipped
+        if self.finished is None:
+            self.finished = time.monotonic()
+
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def exit_code(self):
+        if self.skipped:
+            return exit_codes['canceled']
+        if self.error is not None:
+            return exit_codes['errored']
+        if self.timed_out:
+            return exit_timeout
+        if stop_reason(self.run) == 'confirm':
+            return exit_needs_confirm
+        return exit_codes.get(self.status,exit_codes['errored'])
+
+# Function to get the run from the API and update its watch. HTTP errors are raised
+def poll(client,watch):
+    r = client.get('/runs/' + watch.id)
+    r.raise_for_status()
+    watch.polls += 1
+    return watch.update(jsonapi.document(r)['data'])
+
+# Function to wait until a run is finished (or needs confirmation), or until "timeout" seconds.
+# If "run" is the run data returned when it was created, the first poll waits for its interval.
+# "on_change" is called with the watch every time the status changes
+def wait_run(client,run_id,timeout=None,on_change=None,run=None):
+    watch = RunWatch(run_id)
+    if run is not None:
+        watch.update(run)
+        if on_change:
+            on_change(watch)
+    while not watch.done():
+        wait = max(0.0,watch.due - time.monotonic())
+        if timeout and watch.elapsed() + wait > timeout:
+            watch.timed_out = True
+            watch.finished = time.monotonic()
+            break
+        time.sleep(wait)
+        if poll(client,watch) and on_change:
+            on_change(watch)
+    return watch
+
+# Function to build the payload to create a run in a workspace
+def run_payload(workspace_id,message,destroy=False,auto=False):
+    return records.Run(workspace_id=workspace_id,message=message,is_destroy=destroy,auto_apply=auto).to_payload()
+
+# Function to create a run and start watching it. Errors are kept in the watch and not raised
+def start_run(client,workspace_id,name,message,destroy=False,auto=False):
+    watch = RunWatch(None,name)
+    try:
+        r = client.post('/runs',json=run_payload(workspace_id,message,destroy,auto))
+        r.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        watch.fail(str(err) + ' ' + err.response.text)
+        return watch
+    except requests.exceptions.RequestException as err:
+        watch.fail(str(err))
+        return watch
+    run = jsonapi.document(r)['data']
+    watch.id = run['id']
+    watch.update(run)
+    return watch
+
+# Function to poll a run of a batch. Errors are kept in the watch and not raised
+def poll_safe(client,watch):
+    try:
+        return poll(client,watch)
+    except requests.exceptions.HTTPError as err:
+        watch.fail(str(err) + ' ' + err.response.text)
+    except requests.exceptions.RequestException as err:
+        watch.fail(str(err))
+    return True
+
+# Function to check the dependencies between workspaces {name: [names it depends on]}.
+# It raises ValueError if a dependency is not in the batch or if there's a cycle
+def check_depends(names,depends):
+    for name,deps in depends.items():
+        for dep in [name] + list(deps):
+            if dep not in names:
+                raise ValueError('Workspace "' + dep + '" of the dependencies is not in the workspaces to run')
+    visiting,checked = set(),set()
+    def visit(name,path):
+        if name in checked:
+            return
+        if name in visiting:
+            raise ValueError('Dependency cycle: ' + ' -> '.join(path + [name]))
+        visiting.add(name)
+        for dep in depends.get(name,()):
+            visit(dep,path + [name])
+        visiting.discard(name)
+        checked.add(name)
+    for name in depends:
+        visit(name,[])
+
+# Function to run many workspaces {workspace_id: name} and watch all the runs from one loop.
+# - No more than "max_active" runs are going on at the same time (0 is no limit, and TFC queues them)
+# - A workspace in "depends" {name: [names]} is not run until the runs of its dependencies are
+#   finished with success, and it's skipped if any of them doesn't succeed
+# - Every run is polled with its own adaptive interval, and the polls that are due are done in
+#   parallel by "workers" threads
+# "on_progress" is called with (watches,waiting names,seconds) when any status changes.
+# It returns the watches {name: watch} in the order of the workspaces
+def run_many(client,workspaces,message,destroy=False,auto=False,workers=default_workers,max_active=0,\
+    depends=None,timeout=None,on_progress=None):
+    depends = depends or {}
+    ids = {name: wid for wid,name in workspaces.items()}
+    check_depends(ids,depends)
+    watches = {}
+    waiting = list(ids)
+    started = time.monotonic()
+
+    # 'ready' if all the dependencies succeeded, the name of a failed one, or None if they are not finished
+    def deps_state(name):
+        for dep in depends.get(name,()):
+            if dep not in watches or not watches[dep].done():
+                return None
+            if watches[dep].exit_code() != 0:
+                return dep
+        return 'ready'
+
+    def skip(names,message):
+        for name in names:
+            waiting.remove(name)
+            watches[name] = RunWatch(None,name)
+            watches[name].fail(message,skipped=True)
+
+    with ThreadPoolExecutor(max_workers=max(1,workers)) as pool:
+        while True:
+            changed = False
+            for name in list(waiting):
+                state = deps_state(name)
+                if state not in (None,'ready'):
+                    skip([name],'dependency "' + state + '" did not succeed')
+                    changed = True
+            if timeout and time.monotonic() - started > timeout:
+                skip(list(waiting),'not started before the timeout')
+                for watch in watches.values():
+                    if not watch.done():
+                        watch.timed_out = True
+                        watch.finished = time.monotonic()
+                changed = True
+            # New runs are created while there's room for them
+            active = [w for w in watches.values() if not w.done()]
+            room = max_active - len(active) if max_active else len(waiting)
+            ready = [n for n in waiting if deps_state(n) == 'ready'][:max(0,room)]
+            if ready:
+                for name in ready:
+                    waiting.remove(name)
+                for watch in pool.map(lambda n: start_run(client,ids[n],n,message,destroy,auto),ready):
+                    watches[watch.name] = watch
+                changed = True
+            # The runs that are due are polled in parallel
+            now = time.monotonic()
+            due = [w for w in watches.values() if not w.done() and w.due <= now]
+            if due and any(list(pool.map(lambda w: poll_safe(client,w),due))):
+                changed = True
+            if changed and on_progress:
+                on_progress(watches,waiting,time.monotonic() - started)
+            active = [w for w in watches.values() if not w.done()]
+            if not active and not waiting:
+                break
+            if not active:
+                # Nothing is going on: the waiting workspaces can start (or be skipped) now
+                continue
+            wake = min(w.due for w in active)
+            if timeout:
+                wake = min(wake,started + timeout)
+            time.sleep(max(0.0,wake - time.monotonic()))
+    return {name: watches[name] for name in ids}
+
+# Function to get the exit code of many runs: the worst result (errors first)
+def batch_exit_code(watches):
+    codes = set(w.exit_code() for w in watches.values())
+    for code in (exit_codes['errored'],exit_codes['canceled'],exit_needs_confirm,exit_timeout):
+        if code in codes:
+            return code
+    return 0
+
+# Function to group a run in the summary
+def summary_state(watch):
+    if watch.skipped:
+        return 'skipped'
+    if watch.error is not None:
+        return 'failed'
+    if not watch.done():
+        return 'running' if watch.status in active_states else 'queued'
+    return {0: 'ok', exit_needs_confirm: 'needs confirm', exit_timeout: 'timed out'}.get(watch.exit_code(),'failed')
+
+summary_order = ('waiting','queued','running','ok','needs confirm','failed','skipped','timed out')
+
+# Function to print a progress line with the number of runs in every state
+def print_progress(watches,waiting,seconds):
+    counts = dict.fromkeys(summary_order,0)
+    counts['waiting'] = len(waiting)
+    for watch in watches.values():
+        counts[summary_state(watch)] += 1
+    print('  [%7.1fs] ' % seconds + ', '.join('%d %s' % (counts[i],i) for i in summary_order \
+        if counts[i]))
+
+# Function to print the table of results of run_many
+def print_runs(watches):
+    print('\nRun results:')
+    print('  %-40s %-22s %-22s %5s %8s' % ('WORKSPACE','RUN','STATUS','POLLS','TIME'))
+    for name,watch in watches.items():
+        line = '  %-40s %-22s %-22s %5d %7.1fs' % (name,watch.id or '-',watch.status or summary_state(watch),\
+            watch.polls,watch.elapsed())
+        if watch.error:
+            line = line + '  ' + watch.error
+        print(line)
+    counts = dict.fromkeys(summary_order,0)
+    for watch in watches.values():
+        counts[summary_state(watch)] += 1
+    print('%d workspaces: ' % len(watches) + ', '.join('%d %s' % (counts[i],i) for i in summary_order[3:]))
+
+# Function to print the status changes of a run
+def print_change(watch):
+    print('  [%7.1fs] %s: %s' % (watch.elapsed(),watch.name,watch.status))
+
+# Function to print the end of the wait
+def print_result(watch):
+    if watch.timed_out:
+        print('Stopped waiting for run %s after %.1fs (%d polls), last status: %s' % (watch.id,watch.elapsed(),\
+            watch.polls,watch.status))
+    elif stop_reason(watch.run) == 'confirm':
+        print('Run %s is waiting for confirmation (%s) after %.1fs (%d polls)' % (watch.id,watch.status,\
+            watch.elapsed(),watch.polls))
+    else:
+        print('Run %s finished as "%s" after %.1fs (%d polls)' % (watch.id,watch.status,watch.elapsed(),watch.polls))
@@ -0,0 +1,379 @@
+# Python module to create the tar.gz archives of Terraform configurations for TFC
+# Archives are deterministic: entries are sorted, mtimes/uids are normalised and the gzip header has no
+# timestamp or filename. So the same configuration always gives the same archive and the same hash,
+# and we can know if a configuration changed without uploading it.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import tfarchive
+#   digest = tfarchive.tree_hash('./terraform')
+#   path,digest = tfarchive.create_archive('./terraform','tfc-upload.tar.gz')
+#   stream = tfarchive.StreamArchive('./terraform')    # Iterable of tar.gz chunks, no files written
+#   path,digest = tfarchive.create_archive('./terraform','tfc-upload.tar.gz',workers=8)    # Multi-core gzip
+
+
+import os,tarfile
+import gzip
+import hashlib
+import queue
+import re
+import struct
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+gzip_level = 9
+# Files excluded from the archives by default (like TFC does), before the rules in .terraformignore.
+# Terraform states are never uploaded
+default_ignore = ['.git/','.terraform/','!.terraform/modules/','*.tfstate']
+# Size of the chunks sent when streaming an archive, and max number of chunks waiting to be sent
+chunk_size = 256 * 1024
+max_chunks = 8
+# Size of the blocks compressed in parallel by ParallelGzipWriter
+block_size = 128 * 1024
+
+# Function to remove from a tar entry everything that changes between machines or checkouts
+def normalize(tarinfo):
+    tarinfo.mtime = 0
+    tarinfo.uid = tarinfo.gid = 0
+    tarinfo.uname = tarinfo.gname = ''
+    return tarinfo
+
+# File object that calculates the sha256 of everything written to it, and passes it to "fileobj" (if any)
+class HashWriter:
+    def __init__(self,fileobj=None):
+        self.fileobj = fileobj
+        self.sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self,data):
+        self.sha.update(data)
+        self.size += len(data)
+        if self.fileobj is not None:
+            self.fileobj.write(data)
+        return len(data)
+
+    def tell(self):
+        return self.size
+
+    def hexdigest(self):
+        return self.sha.hexdigest()
+
+# Function to convert a .terraformignore (gitignore style) pattern to a regular expression
+def pattern_regex(pattern):
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('**/',i):
+            regex += '(?:.*/)?'
+            i += 3
+            continue
+        if pattern.startswith('**',i):
+            regex += '.*'
+            i += 2
+            continue
+        if c == '*':
+            regex += '[^/]*'
+        elif c == '?':
+            regex += '[^/]'
+        elif c == '[':
+            end = pattern.find(']',i + 1)
+            if end == -1:
+                regex += re.escape(c)
+            else:
+                body = pattern[i + 1:end]
+                # Only a "!" (or "^") at the start negates the class, anywhere else "^" is a literal character
+                negate = body[:1] in ('!','^')
+                if negate:
+                    body = body[1:]
+                regex += '[' + ('^' if negate else '') + body.replace('^','\\^') + ']'
+                i = end
+        else:
+            regex += re.escape(c)
+        i += 1
+    return regex
+
+# Rules to exclude files from the archives, with the same format as .terraformignore files:
+# https://www.terraform.io/docs/cloud/workspaces/configurations.html#excluding-files-from-upload-with-terraformignore
+# The last matching rule wins, "!" includes again and a trailing "/" only matches directories
+class IgnoreRules:
+    def __init__(self,patterns=default_ignore):
+        self.rules = []
+        for line in patterns:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            # Patterns with a "/" (not at the end) are relative to the root dir, the rest match at any level
+            line = line.rstrip('/')
+            anchored = '/' in line
+            line = line.lstrip('/')
+            if anchored:
+                regex = '^' + pattern_regex(line) + '$'
+            else:
+                regex = '^(?:.*/)?' + pattern_regex(line) + '$'
+            prefix = re.split(r'[*?\[]',line)[0]
+            self.rules.append((re.compile(regex),negate,dir_only,prefix))
+
+    # Rules of a directory: the default ones plus the ones in its .terraformignore file
+    @classmethod
+    def from_dir(cls,tardir):
+        patterns = list(default_ignore)
+        try:
+            with open(os.path.join(tardir,'.terraformignore')) as f:
+                patterns.extend(f.read().splitlines())
+        except OSError:
+            pass
+        return cls(patterns)
+
+    # Function to know if a path (relative to the root dir, with "/") is excluded.
+    # "excluded" is the state inherited from the parent directory
+    def excluded(self,relpath,is_dir,excluded=False):
+        for regex,negate,dir_only,prefix in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relpath):
+                excluded = not negate
+        return excluded
+
+    # Function to know if something inside an excluded directory is included again by a "!" rule with
+    # a path under it (like "!.terraform/modules/"). If not, we don't need to walk that directory at all
+    def may_include_under(self,relpath):
+        for regex,negate,dir_only,prefix in self.rules:
+            if negate and prefix.startswith(relpath + '/'):
+                return True
+        return False
+
+# Generator with the (path,relative_path) of the files and dirs to archive, in sorted order.
+# Excluded directories are pruned before walking them. "stats" counts what is archived and skipped (a pruned
+# directory is counted once in "pruned_dirs": its content is never read, not even to count it)
+def walk(tardir,rules,stats,relpath='',excluded=False):
+    with os.scandir(os.path.join(tardir,relpath) if relpath else tardir) as it:
+        entries = sorted(it,key=lambda entry: entry.name)
+    for entry in entries:
+        path = relpath + '/' + entry.name if relpath else entry.name
+        is_dir = entry.is_dir(follow_symlinks=False)
+        skip = rules.excluded(path,is_dir,excluded)
+        if is_dir:
+            if skip and not rules.may_include_under(path):
+                stats['pruned_dirs'] += 1
+                continue
+            if not skip:
+                yield entry.path,path
+            for item in walk(tardir,rules,stats,path,skip):
+                yield item
+        elif skip:
+            stats['skipped_files'] += 1
+            stats['skipped_bytes'] += entry.stat(follow_symlinks=False).st_size
+        else:
+            stats['files'] += 1
+            stats['bytes'] += entry.stat(follow_symlinks=False).st_size
+            yield entry.path,path
+
+def new_stats():
+    return {'files': 0, 'bytes': 0, 'skipped_files': 0, 'skipped_bytes': 0, 'pruned_dirs': 0}
+
+# Function to write the (uncompressed) tar stream of a directory to a file object.
+# "rules" is an IgnoreRules object (by default the .terraformignore of the directory),
+# and "stats" is an optional dict (new_stats) to know the files archived and skipped
+def write_tar(tardir,fileobj,rules=None,stats=None):
+    if rules is None:
+        rules = IgnoreRules.from_dir(tardir)
+    if stats is None:
+        stats = new_stats()
+    with tarfile.open(fileobj=fileobj,mode='w',format=tarfile.GNU_FORMAT) as tar:
+        tar.addfile(normalize(tar.gettarinfo(tardir,arcname='.')))
+        for path,relpath in walk(tardir,rules,stats):
+            tarinfo = normalize(tar.gettarinfo(path,arcname='./' + relpath))
+            if tarinfo.isreg():
+                with open(path,'rb') as f:
+                    tar.addfile(tarinfo,f)
+            else:
+                tar.addfile(tarinfo)
+
+# Function to get the hash of the content of a configuration, without compressing it.
+# It is the same hash returned by create_archive for the same directory
+def tree_hash(tardir,rules=None,stats=None):
+    sink = HashWriter()
+    write_tar(tardir,sink,rules,stats)
+    return sink.hexdigest()
+
+# Compressor that splits the data in blocks and deflates them in a pool of threads (zlib releases the GIL),
+# like pigz does. Every block ends with a full flush, so the compressed blocks can be concatenated
+# in order as one valid gzip member. Every block is primed with the last 32KB of the previous one,
+# so the compression ratio is almost the same as a single threaded gzip
+class ParallelGzipWriter:
+    def __init__(self,fileobj,level=gzip_level,workers=None,size=block_size):
+        self.fileobj = fileobj
+        self.level = level
+        self.workers = workers or os.cpu_count() or 1
+        self.size = size
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.previous = b''
+        self.crc = 0
+        self.length = 0
+        self.closed = False
+        # Same header as gzip.GzipFile with mtime=0 and no filename
+        xfl = b'\002' if level == 9 else b'\004' if level == 1 else b'\000'
+        self.fileobj.write(b'\037\213\010\000' + struct.pack('<L',0) + xfl + b'\377')
+
+    def compress(self,data,dictionary,last):
+        if dictionary:
+            deflate = zlib.compressobj(self.level,zlib.DEFLATED,-zlib.MAX_WBITS,zlib.DEF_MEM_LEVEL,0,dictionary)
+        else:
+            deflate = zlib.compressobj(self.level,zlib.DEFLATED,-zlib.MAX_WBITS)
+        return deflate.compress(data) + deflate.flush(zlib.Z_FINISH if last else zlib.Z_FULL_FLUSH)
+
+    def submit(self,data,last=False):
+        self.crc = zlib.crc32(data,self.crc)
+        self.length += len(data)
+        self.pending.append(self.pool.submit(self.compress,data,self.previous,last))
+        self.previous = data[-32768:]
+        # Blocks are written in order, and never more than 2 blocks per thread are kept in memory
+        while len(self.pending) > self.workers * 2:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def write(self,data):
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.size:
+            self.submit(bytes(self.buffer[:self.size]))
+            del self.buffer[:self.size]
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.submit(bytes(self.buffer),last=True)
+            self.buffer = bytearray()
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().result())
+            self.fileobj.write(struct.pack('<LL',self.crc & 0xffffffff,self.length & 0xffffffff))
+        finally:
+            self.stop()
+
+    # Stops the pool without waiting for blocks that are not going to be written
+    def stop(self):
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.pool.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,*exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.closed = True
+            self.stop()
+
+# Function to get the gzip compressor for a file object: gzip.GzipFile, or ParallelGzipWriter with workers > 1
+def compressor(fileobj,level=gzip_level,workers=1):
+    if workers is not None and workers <= 1:
+        return gzip.GzipFile(filename='',mode='wb',fileobj=fileobj,compresslevel=level,mtime=0)
+    return ParallelGzipWriter(fileobj,level,workers)
+
+# Function to create the tar.gz file. It returns the path of the file and the hash of its content.
+# "workers" are the threads used to compress it (None to use all the cores)
+def create_archive(tardir,tfcfile,rules=None,level=gzip_level,stats=None,workers=1):
+    with open(tfcfile,'wb') as f:
+        with compressor(f,level,workers) as gz:
+            sink = HashWriter(gz)
+            write_tar(tardir,sink,rules,stats)
+    return os.path.realpath(tfcfile),sink.hexdigest()
+
+# Exception to stop the archive thread when nobody is reading the stream anymore
+class StreamClosed(Exception):
+    pass
+
+# File object that groups the written data in chunks and puts them in a bounded queue.
+# When the queue is full the writer waits, so the memory used is never more than max_chunks * chunk_size
+class QueueWriter:
+    def __init__(self,chunks,closed,size=chunk_size):
+        self.chunks = chunks
+        self.closed = closed
+        self.size = size
+        self.buffer = bytearray()
+
+    def put(self,data):
+        while True:
+            if self.closed.is_set():
+                raise StreamClosed()
+            try:
+                self.chunks.put(data,timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def write(self,data):
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.size:
+            self.put(bytes(self.buffer[:self.size]))
+            del self.buffer[:self.size]
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer = bytearray()
+
+# Iterable with the tar.gz of a directory, created in a background thread while it's being read.
+# It can be used directly as the body of a request (requests sends it chunked). After reading
+# all the chunks, "digest" has the same hash that tree_hash returns
+class StreamArchive:
+    def __init__(self,tardir,rules=None,level=gzip_level,size=chunk_size,buffered=max_chunks,workers=1):
+        self.tardir = tardir
+        self.rules = rules
+        self.workers = workers
+        self.level = level
+        self.size = size
+        self.chunks = queue.Queue(maxsize=buffered)
+        self.closed = threading.Event()
+        self.digest = None
+        self.bytes = 0
+        self.error = None
+        self.thread = None
+
+    def run(self):
+        writer = QueueWriter(self.chunks,self.closed,self.size)
+        try:
+            with compressor(writer,self.level,self.workers) as gz:
+                sink = HashWriter(gz)
+                write_tar(self.tardir,sink,self.rules)
+            writer.flush()
+            self.digest = sink.hexdigest()
+        except StreamClosed:
+            return
+        except Exception as err:
+            self.error = err
+        try:
+            writer.put(None)
+        except StreamClosed:
+            pass
+
+    def __iter__(self):
+        self.thread = threading.Thread(target=self.run,daemon=True)
+        self.thread.start()
+        try:
+            while True:
+                chunk = self.chunks.get()
+                if chunk is None:
+                    break
+                self.bytes += len(chunk)
+                yield chunk
+            if self.error is not None:
+                raise self.error
+        finally:
+            # If the reader stops (upload failed) the archive thread stops too
+            self.closed.set()
@@ -0,0 +1,321 @@
+# Python module with an asyncio client for the Terraform Cloud API
+# Bulk operations (thousands of calls) are done as coroutines in one thread instead of one thread per
+# call, with a semaphore to limit the calls in flight and one connection pool (aiohttp) shared by all.
+# The calls use the same rate limit and retries of the sync client (tfcclient module).
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# It needs aiohttp (pip install aiohttp). The sync functions (workspaces module) don't need it.
+#
+# Usage:
+#   import asyncio
+#   from tfcpy import tfcasync
+#   async def main():
+#       async with tfcasync.AsyncTFCClient(token,concurrency=50) as client:
+#           workspaces = await tfcasync.getlist(client,'<org>')
+#           return await asyncio.gather(*[tfcasync.get_vars(client,i['id']) for i in workspaces])
+#   asyncio.run(main())
+
+
+import time
+from . import apitrace
+from . import jsonapi
+from . import ratelimit
+from . import records
+from . import runwatch
+from . import tfcclient
+from . import workspaces
+from .lazy import installed,lazy_import
+
+asyncio = lazy_import('asyncio')
+requests = lazy_import('requests')
+# aiohttp is optional
+aiohttp = lazy_import('aiohttp') if installed('aiohttp') else None
+
+# Default number of API calls in flight at the same time
+default_concurrency = 50
+
+# Function to know if the asyncio client can be used
+def available():
+    return aiohttp is not None
+
+# Response read by the client. It has the attributes of requests responses that the scripts use,
+# so HTTP errors are raised as requests.exceptions.HTTPError like in the sync functions
+class Response:
+    def __init__(self,status_code,headers,content,url,reason=''):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+        self.reason = reason
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8','replace')
+
+    # The body is decoded only once (jsonapi module)
+    def json(self):
+        return jsonapi.document(self)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            kind = 'Client' if self.status_code < 500 else 'Server'
+            raise requests.exceptions.HTTPError('%d %s Error: %s for url: %s' % (self.status_code,kind,self.reason,\
+                self.url),response=self)
+
+# Class that owns the aiohttp session. The session is opened inside the event loop ("async with")
+class AsyncTFCClient:
+    def __init__(self,token,api=tfcclient.tfapi,concurrency=default_concurrency,timeout=tfcclient.default_timeout,\
+        connect_timeout=tfcclient.default_connect_timeout,rate_limit=ratelimit.default_rate,\
+        max_retries=ratelimit.default_max_retries):
+        if aiohttp is None:
+            raise ImportError('The asyncio client needs aiohttp: pip install aiohttp')
+        self.api = api.rstrip('/')
+        self.concurrency = concurrency
+        self.bucket = ratelimit.TokenBucket(rate_limit)
+        self.max_retries = max_retries
+        # Same counters as the sync client. Coroutines run in one thread, so they don't need a lock
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0.0, 'retry_wait': 0.0}
+        # Functions called with the record of every API call (see the apitrace module)
+        self.hooks = []
+        # Functions called with every response, like the "response" hooks of a requests session
+        # (wscache.WorkspaceCache.response_hook)
+        self.response_hooks = []
+        # Cache of the GET responses (httpcache.ResponseCache), if it's set
+        self.cache = None
+        self.timeout = (connect_timeout,timeout)
+        self.headers = {
+            'Authorization': 'Bearer ' + token,
+            'Content-Type': 'application/vnd.api+json'
+        }
+        self.session = None
+        self.semaphore = None
+
+    async def open(self):
+        # The semaphore and the session belong to the running event loop, so they are created here
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = aiohttp.ClientSession(headers=self.headers,\
+            connector=aiohttp.TCPConnector(limit=self.concurrency),\
+            timeout=aiohttp.ClientTimeout(sock_connect=self.timeout[0],sock_read=self.timeout[1]))
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self,*exc):
+        await self.close()
+
+    def url(self,path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return self.api + '/' + path.lstrip('/')
+
+    # All the API calls go through here, with the same rules (hooks and cache) of tfcclient.TFCClient.request.
+    # Payloads are passed with "json" and sent with the JSON:API content type
+    async def request(self,method,path,**kwargs):
+        url = self.url(path)
+        if 'json' in kwargs:
+            kwargs['data'] = jsonapi.dumps(kwargs.pop('json'))
+        if not self.hooks:
+            return await self.fetch(method,url,{},**kwargs)
+        call = {}
+        started = time.time()
+        clock = time.perf_counter()
+        r = error = None
+        try:
+            r = await self.fetch(method,url,call,**kwargs)
+            return r
+        except Exception as err:
+            error = err
+            raise
+        finally:
+            record = {'time': started, 'method': method.upper(), 'endpoint': apitrace.endpoint(self.api,url),\
+                'url': url, 'status': r.status_code if r is not None else None,\
+                'error': (str(error) or type(error).__name__) if error is not None else None,\
+                'bytes_sent': apitrace.body_size(kwargs.get('data')),\
+                'bytes_received': (0 if call.get('cache') else len(r.content)) if r is not None else None,\
+                'seconds': time.perf_counter() - clock, 'retries': call.get('retries',0),\
+                'throttled': call.get('throttled',0.0), 'retry_wait': call.get('retry_wait',0.0),\
+                'cache': call.get('cache')}
+            for hook in self.hooks:
+                hook(record)
+
+    # Function to do a call with the response cache, like tfcclient.TFCClient.fetch
+    async def fetch(self,method,url,call,**kwargs):
+        if self.cache is None or not url.startswith(self.api):
+            return await self.send(method,url,call,**kwargs)
+        if method.upper() != 'GET':
+            try:
+                return await self.send(method,url,call,**kwargs)
+            finally:
+                self.cache.invalidate()
+        url = requests.Request('GET',url,params=kwargs.pop('params',None)).prepare().url
+        if not self.cache.cacheable(url):
+            return await self.send(method,url,call,**kwargs)
+        entry = self.cache.get(url)
+        if entry is not None:
+            if entry.fresh(self.cache.ttl):
+                self.cache.count('hits')
+                call['cache'] = 'hit'
+                return Response(entry.status,entry.headers,entry.body,entry.url,'OK')
+            kwargs['headers'] = dict(kwargs.get('headers') or {},**entry.validators())
+        r = await self.send(method,url,call,**kwargs)
+        if r.status_code == 304 and entry is not None:
+            self.cache.count('revalidated')
+            call['cache'] = 'revalidated'
+            return Response(entry.status,entry.headers,entry.body,entry.url,'OK')
+        if r.status_code == 200:
+            self.cache.put(url,r.status_code,r.headers,r.content)
+        return r
+
+    async def send(self,method,url,call,**kwargs):
+        limited = url.startswith(self.api)
+        attempt = 0
+        while True:
+            async with self.semaphore:
+                if limited:
+                    wait = self.bucket.reserve()
+                    self.stats['throttled'] += wait
+                    call['throttled'] = call.get('throttled',0.0) + wait
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                self.stats['requests'] += 1
+                try:
+                    async with self.session.request(method,url,**kwargs) as r:
+                        response = Response(r.status,r.headers,await r.read(),str(r.url),r.reason or '')
+                except (aiohttp.ClientError,asyncio.TimeoutError) as err:
+                    if attempt >= self.max_retries or method.upper() not in ratelimit.idempotent_methods:
+                        raise requests.exceptions.ConnectionError(str(err) or type(err).__name__)
+                    wait = ratelimit.backoff(attempt)
+                else:
+                    if attempt >= self.max_retries or not ratelimit.should_retry(method,response.status_code):
+                        for hook in self.response_hooks:
+                            hook(response)
+                        return response
+                    wait = ratelimit.retry_after(response)
+                    if wait is None:
+                        wait = ratelimit.backoff(attempt)
+                    elif response.status_code == 429 and limited:
+                        self.bucket.pause(wait)
+            attempt += 1
+            self.stats['retries'] += 1
+            self.stats['retry_wait'] += wait
+            call['retries'] = attempt
+            call['retry_wait'] = call.get('retry_wait',0.0) + wait
+            await asyncio.sleep(wait)
+
+    async def get(self,path,**kwargs):
+        return await self.request('GET',path,**kwargs)
+
+    async def post(self,path,**kwargs):
+        return await self.request('POST',path,**kwargs)
+
+    async def patch(self,path,**kwargs):
+        return await self.request('PATCH',path,**kwargs)
+
+    async def delete(self,path,**kwargs):
+        return await self.request('DELETE',path,**kwargs)
+
+    # Function to get a page (the whole JSON document) from a paginated list
+    async def get_page(self,path,number=None,params=None):
+        params = dict(params or {})
+        if number is not None:
+            params['page[number]'] = number
+        r = await self.get(path,params=params)
+        r.raise_for_status()
+        return r.json()
+
+    # Function to get all the items of a paginated list. The first page is used to know the total
+    # pages, and the rest of pages are requested at the same time. With "fields" the items are
+    # projected to records with only those attributes (jsonapi.project)
+    async def get_all(self,path,params=None,page_size=None,fields=None):
+        params = dict(params or {})
+        if page_size:
+            params['page[size]'] = page_size
+        first = await self.get_page(path,params=params)
+        data = [jsonapi.project(i,fields) for i in first['data']] if fields is not None else first['data']
+        totalpages = ((first.get('meta') or {}).get('pagination') or {}).get('total-pages',1)
+        del first
+        if totalpages > 1:
+            pages = await asyncio.gather(*[self.get_page(path,i,params) for i in range(2,totalpages + 1)])
+            for page in pages:
+                data.extend(jsonapi.project(i,fields) for i in page['data'])
+        return data
+
+# Functions with the same API calls as the sync functions of the workspaces and uploadconfig modules.
+# HTTP errors are raised as requests.exceptions.HTTPError
+
+# Function to get the workspaces of an organization (or the details of one workspace with "wname")
+# "search", "tags" and "fields" are filtered by the API, like in workspaces.getlist
+async def getlist(client,organization,wname=None,page_size=100,search=None,tags=None,fields=None):
+    if wname:
+        return [(await client.get_page('/organizations/' + organization + '/workspaces/' + wname))['data']]
+    return await client.get_all('/organizations/' + organization + '/workspaces',\
+        params=workspaces.list_params(search,tags,fields),page_size=page_size,fields=fields)
+
+async def get_vars(client,workspace_id):
+    return {'data': await client.get_all('/workspaces/' + workspace_id + '/vars')}
+
+async def get_variables(client,workspace_id):
+    return [records.Variable.from_api(i) for i in await client.get_all('/workspaces/' + workspace_id + '/vars')]
+
+# The variables are records (records.Variable), like in workspaces.create_var and workspaces.update_var
+async def create_var(client,workspace_id,var):
+    r = await client.post('/workspaces/' + workspace_id + '/vars',json=var.to_payload())
+    r.raise_for_status()
+    return r.json()
+
+async def update_var(client,workspace_id,var_id,var):
+    r = await client.patch('/workspaces/' + workspace_id + '/vars/' + var_id,\
+        json=var.replace(id=var_id).to_payload(update=True))
+    r.raise_for_status()
+    return r.json()
+
+async def delete_var(client,workspace_id,var_id):
+    r = await client.delete('/workspaces/' + workspace_id + '/vars/' + var_id)
+    r.raise_for_status()
+
+async def run_workspace(client,workspace_id,message,destroy=False,auto=False):
+    if destroy is True:
+        message = 'Destroying... ' + message
+    r = await client.post('/runs',json=runwatch.run_payload(workspace_id,message,destroy,auto))
+    r.raise_for_status()
+    return r.json()
+
+# Function to create a new configuration version. It returns the upload url
+async def create_conf(client,workspace_id,queue):
+    conf_payload = {
+        "data": {
+            "type": "configurations-versions",
+            "attributes": {
+                "auto-queue-runs": queue
+            }
+        }
+    }
+    r = await client.post('/workspaces/' + workspace_id + '/configuration-versions',json=conf_payload)
+    r.raise_for_status()
+    return r.json()['data']['attributes']['upload-url']
+
+# Function to run a coroutine function with a new client: asyncio.run(func(client,*args)).
+# The counters of the client are added to the ones of "stats_client" (the sync client), if any,
+# the calls are reported to its hooks, and its response cache is used. "response_hooks" are called with
+# every response (AsyncTFCClient.response_hooks)
+def run(func,*args,token,stats_client=None,response_hooks=(),**client_args):
+    async def main():
+        async with AsyncTFCClient(token,**client_args) as client:
+            client.response_hooks.extend(response_hooks)
+            if stats_client is not None:
+                client.hooks = stats_client.hooks
+                client.cache = stats_client.cache
+            try:
+                return await func(client,*args)
+            finally:
+                if stats_client is not None:
+                    for name,value in client.stats.items():
+                        stats_client.count(name,value)
+    return asyncio.run(main())
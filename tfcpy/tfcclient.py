@@ -0,0 +1,268 @@
+# Python module with a shared HTTP client for the Terraform Cloud API
+# All the API calls go through the same requests Session, so the TCP+TLS connections are kept alive
+# and reused between calls instead of opening a new one for every request.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import tfcclient
+#   client = tfcclient.TFCClient(token,pool_size=10,timeout=30)
+#   r = client.get(tfcclient.tfapi + '/organizations/<org>/workspaces')
+#
+# The API calls are scheduled with a token bucket (ratelimit module) to keep under the TFC rate limit,
+# and 429/5xx responses are retried honouring Retry-After, or with exponential backoff.
+# The functions in client.hooks get a record of every API call (apitrace module, "--trace" in the CLI),
+# and GET responses are cached if client.cache is set (httpcache module).
+
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from . import apitrace
+from . import jsonapi
+from . import ratelimit
+from .lazy import lazy_import
+
+# requests is loaded when the first client is created
+requests = lazy_import('requests')
+
+tfapi = 'https://app.terraform.io/api/v2'
+
+# Default values for the connection pool and timeouts (in seconds)
+default_pool_size = 10
+default_connect_timeout = 10
+default_timeout = 30
+
+# Function to get a requests response from a cached one (httpcache.Entry)
+def cached_response(entry,request=None):
+    r = requests.Response()
+    r.status_code = entry.status
+    r.reason = 'OK'
+    r.headers = requests.structures.CaseInsensitiveDict(entry.headers)
+    r._content = entry.body
+    r.encoding = 'utf-8'
+    r.url = entry.url
+    r.request = request if request is not None else requests.Request('GET',entry.url).prepare()
+    return r
+
+# Class that owns the keep-alive connection pool and the auth headers
+class TFCClient:
+    def __init__(self,token,api=tfapi,pool_size=default_pool_size,timeout=default_timeout,\
+        connect_timeout=default_connect_timeout,rate_limit=ratelimit.default_rate,\
+        max_retries=ratelimit.default_max_retries):
+        self.api = api.rstrip('/')
+        self.pool_size = pool_size
+        self.bucket = ratelimit.TokenBucket(rate_limit)
+        self.max_retries = max_retries
+        # Counters of the client: API requests, retries and seconds waiting for the rate limit or retries
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0.0, 'retry_wait': 0.0}
+        self.stats_lock = threading.Lock()
+        # Functions called with the record of every API call (see the apitrace module)
+        self.hooks = []
+        # Cache of the GET responses (httpcache.ResponseCache), if it's set
+        self.cache = None
+        # requests accepts a (connect, read) tuple for timeouts
+        self.timeout = (connect_timeout,timeout)
+        self.headers = {
+            'Authorization': 'Bearer ' + token,
+            'Content-Type': 'application/vnd.api+json'
+        }
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # One pool per host, with up to "pool_size" connections kept alive
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,pool_maxsize=pool_size)
+        self.session.mount('https://',adapter)
+        self.session.mount('http://',adapter)
+
+    # Relative paths are joined to the API base url, so both '/runs' and full urls are accepted
+    def url(self,path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return self.api + '/' + path.lstrip('/')
+
+    def count(self,name,value=1):
+        with self.stats_lock:
+            self.stats[name] += value
+
+    # All the API calls go through here. Only the calls to the API url are rate limited
+    # (the upload urls of configuration versions are not part of the API limit).
+    # When the call is finished (with its retries) it's reported to the functions in "hooks"
+    def request(self,method,path,**kwargs):
+        kwargs.setdefault('timeout',self.timeout)
+        url = self.url(path)
+        # Payloads are encoded here (with orjson if it's installed), sent with the JSON:API content type
+        if 'json' in kwargs:
+            kwargs['data'] = jsonapi.dumps(kwargs.pop('json'))
+        if not self.hooks:
+            return self.fetch(method,url,{},**kwargs)
+        call = {}
+        started = time.time()
+        clock = time.perf_counter()
+        r = error = None
+        try:
+            r = self.fetch(method,url,call,**kwargs)
+            return r
+        except Exception as err:
+            error = err
+            raise
+        finally:
+            record = {'time': started, 'method': method.upper(), 'endpoint': apitrace.endpoint(self.api,url),\
+                'url': url, 'status': r.status_code if r is not None else None,\
+                'error': (str(error) or type(error).__name__) if error is not None else None,\
+                'bytes_sent': apitrace.body_size(r.request.body) if r is not None else None,\
+                'bytes_received': (0 if call.get('cache') else len(r.content)) if r is not None else None,\
+                'seconds': time.perf_counter() - clock, 'retries': call.get('retries',0),\
+                'throttled': call.get('throttled',0.0), 'retry_wait': call.get('retry_wait',0.0),\
+                'cache': call.get('cache')}
+            for hook in self.hooks:
+                hook(record)
+
+    # Function to do a call with the response cache, if the client has one: GET responses are served
+    # from the cache (or revalidated and served from it after a 304), and any other call invalidates it
+    def fetch(self,method,url,call,**kwargs):
+        if self.cache is None or not url.startswith(self.api):
+            return self.send(method,url,call,**kwargs)
+        if method.upper() != 'GET':
+            try:
+                return self.send(method,url,call,**kwargs)
+            finally:
+                self.cache.invalidate()
+        # The params are part of the key
+        url = requests.Request('GET',url,params=kwargs.pop('params',None)).prepare().url
+        if not self.cache.cacheable(url):
+            return self.send(method,url,call,**kwargs)
+        entry = self.cache.get(url)
+        if entry is not None:
+            if entry.fresh(self.cache.ttl):
+                self.cache.count('hits')
+                call['cache'] = 'hit'
+                return cached_response(entry)
+            kwargs['headers'] = dict(kwargs.get('headers') or {},**entry.validators())
+        r = self.send(method,url,call,**kwargs)
+        if r.status_code == 304 and entry is not None:
+            self.cache.count('revalidated')
+            call['cache'] = 'revalidated'
+            return cached_response(entry,r.request)
+        if r.status_code == 200:
+            self.cache.put(url,r.status_code,r.headers,r.content)
+        return r
+
+    # Function to send a request with the rate limit and the retries. The waits and retries of this
+    # call are added to "call" too
+    def send(self,method,url,call,**kwargs):
+        limited = url.startswith(self.api)
+        # If the body is a file we can rewind it to retry, but streams can only be sent once
+        data = kwargs.get('data')
+        position = None
+        if data is not None and not isinstance(data,(bytes,str)):
+            position = data.tell() if hasattr(data,'seek') else None
+            retries = self.max_retries if position is not None else 0
+        else:
+            retries = self.max_retries
+        attempt = 0
+        while True:
+            if limited:
+                wait = self.bucket.acquire()
+                self.count('throttled',wait)
+                call['throttled'] = call.get('throttled',0.0) + wait
+            self.count('requests')
+            try:
+                r = self.session.request(method,url,**kwargs)
+            except requests.exceptions.ConnectionError:
+                if attempt >= retries or method.upper() not in ratelimit.idempotent_methods:
+                    raise
+                wait = ratelimit.backoff(attempt)
+            else:
+                if attempt >= retries or not ratelimit.should_retry(method,r.status_code):
+                    return r
+                wait = ratelimit.retry_after(r)
+                if wait is None:
+                    wait = ratelimit.backoff(attempt)
+                elif r.status_code == 429 and limited:
+                    # Everybody using this token has to wait, not only this thread
+                    self.bucket.pause(wait)
+                r.close()
+            attempt += 1
+            self.count('retries')
+            self.count('retry_wait',wait)
+            call['retries'] = attempt
+            call['retry_wait'] = call.get('retry_wait',0.0) + wait
+            time.sleep(wait)
+            if position is not None:
+                data.seek(position)
+
+    def get(self,path,**kwargs):
+        return self.request('GET',path,**kwargs)
+
+    def post(self,path,**kwargs):
+        return self.request('POST',path,**kwargs)
+
+    def patch(self,path,**kwargs):
+        return self.request('PATCH',path,**kwargs)
+
+    def put(self,path,**kwargs):
+        return self.request('PUT',path,**kwargs)
+
+    def delete(self,path,**kwargs):
+        return self.request('DELETE',path,**kwargs)
+
+    # Generator that yields the "data" list of every page of a paginated API list, in page order.
+    # The first page is used to know the total pages, and the rest of pages are fetched by a pool
+    # of "workers" threads, with no more than "workers" pages requested ahead of the caller.
+    # With "fields" the items are projected to records with only those attributes (jsonapi.project).
+    # HTTP errors are raised as requests.exceptions.HTTPError
+    def iter_pages(self,path,params=None,page_size=None,workers=1,fields=None):
+        params = dict(params or {})
+        if page_size:
+            params['page[size]'] = page_size
+        r = self.get(path,params=params)
+        r.raise_for_status()
+        first = jsonapi.document(r)
+        totalpages = ((first.get('meta') or {}).get('pagination') or {}).get('total-pages',1)
+        yield [jsonapi.project(i,fields) for i in first['data']] if fields is not None else first['data']
+        del first,r
+        if totalpages < 2:
+            return
+        if workers <= 1:
+            for number in range(2,totalpages + 1):
+                yield self.get_page(path,number,params,fields)
+            return
+        with ThreadPoolExecutor(max_workers=min(workers,totalpages - 1)) as pool:
+            pending = deque()
+            pages = iter(range(2,totalpages + 1))
+            try:
+                for number in pages:
+                    pending.append(pool.submit(self.get_page,path,number,params,fields))
+                    if len(pending) >= workers:
+                        break
+                while pending:
+                    page = pending.popleft().result()
+                    number = next(pages,None)
+                    if number is not None:
+                        pending.append(pool.submit(self.get_page,path,number,params,fields))
+                    yield page
+            finally:
+                # If the caller stops iterating we don't wait for pages that nobody is going to read
+                for future in pending:
+                    future.cancel()
+
+    # Function to get the "data" of a page from a paginated list (projected with "fields", if any)
+    def get_page(self,path,number,params=None,fields=None):
+        params = dict(params or {})
+        params['page[number]'] = number
+        r = self.get(path,params=params)
+        r.raise_for_status()
+        data = jsonapi.document(r)['data']
+        if fields is not None:
+            return [jsonapi.project(i,fields) for i in data]
+        return data
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
@@ -0,0 +1,371 @@
+# Python script to create and upload a configuration version in Terraform Cloud
+# It is designed according to official API-Driven Run Workflow: https://www.terraform.io/docs/cloud/run/api.html
+#
+# The API functions take the client (tfcclient.TFCClient), and HTTP errors are raised as
+# requests.exceptions.HTTPError (the CLI prints them), so the module can be used from any Python code.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage: python3 upload-config.py <organization> <workspace> \
+#           -d <terraform_dir> \
+#           -f <tar.gz_filname> \
+#           --run <true|false>
+#           -h
+
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from . import jsonapi
+from . import tfarchive
+from . import wscache
+from .lazy import lazy_import
+
+requests = lazy_import('requests')
+
+# File with the hashes of the last configurations uploaded to the workspaces
+manifest_file = os.path.join(wscache.cache_dir,'uploads.json')
+manifest_lock = threading.Lock()
+default_workers = 8
+# Policies to select a configuration version (see find_config)
+select_policies = ['ask','reuse-newest-pending','always-new','reuse-by-hash']
+
+# Function to filter files for TFStates and .terraform config dir
+# (tarfile filter, the archives of this module use the tfarchive.IgnoreRules instead)
+def filter_func(tarinfo):
+  if os.path.splitext(tarinfo.name)[1] == '.tfstate':
+    return None
+  # The tarinfo name is relative to the archive, so we check the type of the entry and not the path
+  if os.path.split(tarinfo.name)[1] == '.terraform' and tarinfo.isdir():
+    print(tarinfo.name)
+    return None
+  #print(tarinfo.name)
+  return tarinfo
+
+# Function to create a tar.gz file
+# The archive is deterministic (tfarchive module), so the same configuration creates the same file.
+# Files are excluded with the default rules and the .terraformignore file of the directory
+# "level" is the gzip compression level and "workers" the threads to compress it (None for all the cores)
+# It returns the path of the file and the hash of what was archived (the same as config_hash)
+def create_upload(tardir,tfcfile,stats=None,level=tfarchive.gzip_level,workers=1):
+    # If we use '-d' paramater lets use that directory, if not we use the current dir
+    return tfarchive.create_archive(tardir,tfcfile,stats=stats,level=level,workers=workers)
+
+# Function to get the hash of the configuration that create_upload would archive (without compressing it)
+def config_hash(tardir,stats=None):
+    return tfarchive.tree_hash(tardir,stats=stats)
+
+# Function to get the hash to record for an upload: the hash of the archive uploaded. The configuration
+# is hashed before archiving it (to skip the upload if it didn't change), so if it changed in between
+# the hash of the archive is different, and it's the one that matches the content uploaded
+def archived_hash(digest,archived):
+    if archived != digest:
+        print('The configuration changed while it was archived. Hash of the archive uploaded: ' + archived)
+    return archived
+
+# Function to print the files archived and skipped (tfarchive.new_stats)
+def print_stats(stats):
+    print('Archived %d files (%d bytes). Skipped %d files (%d bytes) and %d directories' % (stats['files'],\
+        stats['bytes'],stats['skipped_files'],stats['skipped_bytes'],stats['pruned_dirs']))
+
+# Functions to keep a local manifest with the hash of the last configuration uploaded to every workspace
+# {workspace_id: {"hash": <sha256>, "id": <configuration_version_id>, "done": <bool>}}
+# The entry is saved when the configuration version is chosen (before the upload, "done" is false), and
+# "done" is set once the archive is uploaded. So a configuration version with "done" was already used
+# (its upload url can't be used again, even if TFC is still processing it), and one without "done" can
+# be reused to upload the same content. Entries of old manifests have no "done": they were saved after
+# the upload
+def load_manifest(path=manifest_file):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return {}
+
+def save_manifest(manifest,path=manifest_file):
+    try:
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        tmp = path + '.' + str(os.getpid())
+        with open(tmp,'w') as f:
+            json.dump(manifest,f,indent=2)
+        os.replace(tmp,path)
+    except OSError as err:
+        print('Cannot write uploads manifest "' + path + '": ' + str(err))
+
+def record_upload(workspace_id,digest,config_id,done=True,path=manifest_file):
+    # Uploads to many workspaces record their results from different threads
+    with manifest_lock:
+        manifest = load_manifest(path)
+        manifest[workspace_id] = {'hash': digest, 'id': config_id, 'done': done}
+        save_manifest(manifest,path)
+
+# Function to know if the archive of a manifest entry was uploaded
+def upload_done(entry):
+    return entry.get('done',True)
+
+# Function to get the workspace id
+# If a WorkspaceCache is passed (wscache module) the id is taken from there when possible
+def get_workspc_id(org,workspace,client,cache=None):
+    if cache is not None:
+        wid = cache.get(org,workspace)
+        if wid:
+            return wid
+    url = client.url('/organizations/' + org + '/workspaces/' + workspace)
+    r = client.get(url)
+    try:
+        r.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        if cache is not None and err.response.status_code == 404:
+            cache.invalidate(org,workspace)
+        raise
+    wid = jsonapi.document(r)['data']['id']
+    if cache is not None:
+        cache.set(org,workspace,wid)
+    return wid
+
+# Function to create a new configuration version. It returns its data (id, attributes...)
+def create_config_version(workspace_id,queue,client):
+    url = client.url('/workspaces/' \
+        + workspace_id + \
+        '/configuration-versions')
+    conf_payload = {
+        "data": {
+            "type": "configurations-versions",
+            "attributes": {
+                "auto-queue-runs": queue
+            }
+        }
+    }
+    r = client.post(url,json=conf_payload)
+    r.raise_for_status()
+    return jsonapi.document(r)['data']
+
+# Function to create a new configuration
+def create_conf(workspace_id,queue,client):
+    return create_config_version(workspace_id,queue,client)['attributes']['upload-url']
+
+# Function to get the newest configuration version of a workspace (None if there are no configurations)
+def latest_config(workspace_id,client):
+    url = client.url('/workspaces/' + workspace_id + '/configuration-versions')
+    r = client.get(url,params={'page[size]': 1})
+    r.raise_for_status()
+    data = jsonapi.document(r)['data']
+    return data[0] if data else None
+
+# Function to get a configuration version by id (None if it doesn't exist anymore)
+def get_config(config_id,client):
+    url = client.url('/configuration-versions/' + config_id)
+    r = client.get(url)
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return jsonapi.document(r)['data']
+
+# Statuses of a configuration version whose archive was uploaded (TFC is processing it, or it's ready)
+uploaded_states = ('pending','fetching','uploaded')
+
+# Function to know if a configuration version queues a run (or not) like "queue" asks. A pending one created
+# with the other setting is never reused: it would queue a run nobody asked for, or not queue the one asked.
+# "queue" is a bool or the "true"/"false" of the --run argument
+def same_queue(config,queue):
+    if isinstance(queue,str):
+        queue = queue.lower() == 'true'
+    return config['attributes'].get('auto-queue-runs',True) == queue
+
+# Function to know if a configuration was already uploaded to a workspace, using the uploads manifest.
+# It only trusts the manifest if that configuration version is still the newest one of the workspace.
+# It returns (status,config) where status is "uploaded" (our archive was uploaded, nothing to do),
+# "pending" (it was created for this content and the same "queue" but the upload didn't finish, so we can
+# reuse its upload url) or None (we need to upload it)
+def uploaded_config(workspace_id,digest,client,queue,path=manifest_file):
+    entry = load_manifest(path).get(workspace_id)
+    if not entry or entry.get('hash') != digest:
+        return None,None
+    latest = latest_config(workspace_id,client)
+    if latest is None or latest['id'] != entry.get('id'):
+        return None,None
+    status = latest['attributes']['status']
+    if upload_done(entry):
+        return ('uploaded',latest) if status in uploaded_states else (None,None)
+    return ('pending',latest) if status == 'pending' and same_queue(latest,queue) else (None,None)
+
+# Function to upload configuration
+def upload_conf(upload_file,upurl,client):
+    url = upurl
+    # The upload url is already signed, so we don't send the API token to it
+    headers = {
+        'Authorization': None,
+        'Content-Type': 'application/octet-stream'
+    }
+    with open(upload_file,'rb') as data:
+        r = client.put(url,headers=headers,data=data)
+    r.raise_for_status()
+    return r.text
+
+# Generator to iterate the configuration versions of a workspace, page by page
+def iter_config_versions(workspace_id,client):
+    for page in client.iter_pages('/workspaces/' + workspace_id + '/configuration-versions'):
+        for item in page:
+            yield item
+
+# Function to upload a configuration archive while it is being created (tfarchive.StreamArchive),
+# without writing a file. The body is sent with chunked transfer encoding
+def upload_stream(stream,upurl,client):
+    url = upurl
+    # The upload url is already signed, so we don't send the API token to it
+    headers = {
+        'Authorization': None,
+        'Content-Type': 'application/octet-stream'
+    }
+    r = client.put(url,headers=headers,data=iter(stream))
+    r.raise_for_status()
+    return r.text
+
+# Function to create the archive stream of a directory, with the same files that create_upload uses
+def create_stream(tardir,level=tfarchive.gzip_level,workers=1):
+    return tfarchive.StreamArchive(tardir,level=level,workers=workers)
+
+# Function to get all configs and status
+def config_status(workspace_id,client):
+    # for i in jsonapi.document(r)['data']:
+    #     print(i['id'],i['attributes']['status'])
+    return {'data': list(iter_config_versions(workspace_id,client))}
+
+# Function to select an existing configuration that is pending or
+def select_config(config_status):
+    config_select = []
+    for i in config_status['data']:
+        print(i['id'],i['attributes']['status'])
+        if i['attributes']['status'] == "pending":
+            config_values = {
+                "id": i['id'],
+                "upload-url": i['attributes']['upload-url'],
+                "url": i['links']['self']
+            }
+            config_select.append(config_values)
+    print('\n\n')
+
+    print(config_select)
+    if not config_select:
+        print('There are no pending configurations. Let\'s create a new one')
+        return None
+    else:
+        print("There are some configurations that are pending to upload:")
+        for item in config_select:
+            print('\t' + item['id'])
+        choice = str(input("Please, type the id of the configuration you want to upload, or press Enter to create a new one: "))
+        print('\nSelected configuration version: ' + choice)
+
+        if choice not in [item['id'] for item in config_select]:
+            print('Let\'s create a new configuration version')
+            return None
+        else:
+            for item in config_select:
+                if choice == item['id']:
+                    return(item['upload-url'] )
+
+
+    # choice = input(print(item['id']) for item in config_select)
+    # print(choice)
+
+# Generator with the pending configuration versions of a workspace (newest first), only the ones created with
+# the same "queue" if it's passed. Pages are requested only while the caller keeps iterating
+def iter_pending(workspace_id,client,queue=None):
+    for i in iter_config_versions(workspace_id,client):
+        if i['attributes']['status'] == 'pending' and (queue is None or same_queue(i,queue)):
+            yield i
+
+# Function to choose the configuration version to upload to, following a selection policy:
+#   ask: list the pending configurations and ask which one to use (interactive)
+#   reuse-newest-pending: use the newest pending configuration
+#   always-new: never reuse a configuration (no API calls at all)
+#   reuse-by-hash: use the configuration created for the same content whose upload didn't finish (uploads
+#   manifest). It's read by id (one call), and never reused once our archive was uploaded to it
+# If "queue" is passed, only the configurations created with the same auto-queue-runs are reused (same_queue).
+# It returns the configuration version data, or None to create a new one.
+# Configurations are read page by page and the search stops with the first match
+def find_config(workspace_id,client,policy='ask',digest=None,queue=None,path=manifest_file):
+    if policy == 'always-new':
+        return None
+    if policy == 'reuse-newest-pending':
+        return next(iter_pending(workspace_id,client,queue),None)
+    if policy == 'reuse-by-hash':
+        entry = load_manifest(path).get(workspace_id)
+        if not entry or entry.get('hash') != digest or upload_done(entry) or not entry.get('id'):
+            return None
+        config = get_config(entry['id'],client)
+        if config is None or config['attributes']['status'] != 'pending':
+            return None
+        if queue is not None and not same_queue(config,queue):
+            return None
+        return config
+    pending = list(iter_pending(workspace_id,client,queue))
+    upurl = select_config({'data': pending})
+    for i in pending:
+        if i['attributes']['upload-url'] == upurl:
+            return i
+    return None
+
+
+# Function to upload an archive (already created) to a workspace, without asking anything.
+# It skips the upload if the same content is already the newest configuration (unless "force"),
+# reuses a pending configuration version created for the same content (and "queue") and not uploaded, or creates
+# a new one.
+# The configuration version is saved in the manifest before the upload, and marked as done after it
+# It returns (status,config_id) where status is "skipped", "reused" or "uploaded"
+# "policy" is the find_config selection policy ("ask" is not possible here, so it creates a new one)
+def upload_workspace(workspace_id,upfile,digest,queue,client,force=False,policy='reuse-by-hash',\
+    path=manifest_file):
+    status,config = (None,None) if force else uploaded_config(workspace_id,digest,client,queue,path)
+    if status == 'uploaded':
+        return 'skipped',config['id']
+    # The pending configuration of the manifest is only reused if the policy reuses configurations
+    if status != 'pending' or policy == 'always-new':
+        config = None if policy == 'ask' else find_config(workspace_id,client,policy,digest,queue,path)
+    if config is not None:
+        result = 'reused'
+    else:
+        config = create_config_version(workspace_id,queue,client)
+        result = 'uploaded'
+    record_upload(workspace_id,digest,config['id'],done=False,path=path)
+    upload_conf(upfile,config['attributes']['upload-url'],client)
+    record_upload(workspace_id,digest,config['id'],path=path)
+    return result,config['id']
+
+# Function to upload the same archive to many workspaces ({workspace_id: name}) in parallel.
+# It returns a list of results (one dict per workspace) with the status and the time of every upload
+def upload_many(workspaces,upfile,digest,queue,client,workers=default_workers,force=False,policy='reuse-by-hash',\
+    path=manifest_file):
+    def upload(wid):
+        start = time.monotonic()
+        result = {'workspace': workspaces[wid], 'id': wid, 'status': 'error', 'config': None, 'error': None}
+        try:
+            result['status'],result['config'] = upload_workspace(wid,upfile,digest,queue,client,force,policy,path)
+        # One workspace can't stop the rest: the errors are printed with the results, not from the threads
+        except requests.exceptions.HTTPError as err:
+            result['error'] = str(err) + ' ' + err.response.text.strip()
+        except (requests.exceptions.RequestException,OSError) as err:
+            result['error'] = str(err)
+        result['seconds'] = time.monotonic() - start
+        return result
+    ids = list(workspaces)
+    if not ids:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1,min(workers,len(ids)))) as pool:
+        return list(pool.map(upload,ids))
+
+# Function to print the results of upload_many. It returns the number of errors
+def print_uploads(results):
+    print('\nUpload results:')
+    for i in results:
+        line = '  %-40s %-9s %-24s %6.2fs' % (i['workspace'],i['status'],i['config'] or '-',i['seconds'])
+        if i['error']:
+            line = line + '  ' + i['error']
+        print(line)
+    errors = len([i for i in results if i['status'] == 'error'])
+    print('%d workspaces: %d uploaded, %d reused, %d skipped, %d errors' % (len(results),\
+        len([i for i in results if i['status'] == 'uploaded']),len([i for i in results if i['status'] == 'reused']),\
+        len([i for i in results if i['status'] == 'skipped']),errors))
+    return errors
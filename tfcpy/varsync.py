@@ -0,0 +1,245 @@
+# Python module to synchronize the variables of a Terraform Cloud workspace
+# It compares the variables that we want with the ones that already exist in the workspace, and only
+# does the API calls that are needed (create, update or delete), running them in parallel.
+# The variables are records (records.Variable), both the existing ones and the desired ones.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import varsync
+#   desired = [varsync.new_var('key','value','env',sensitive=True)]
+#   plan = varsync.plan_vars(existing_vars,desired)
+#   results = varsync.apply_plan(client,workspace_id,plan)
+#
+# The bulk functions have asyncio versions (*_async) that take a tfcasync.AsyncTFCClient
+
+
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from . import records
+from .lazy import lazy_import
+
+asyncio = lazy_import('asyncio')
+requests = lazy_import('requests')
+
+default_workers = 8
+
+# Function to convert 'true'/'false' strings (from CSV or tfvars files) to booleans
+def to_bool(value):
+    if isinstance(value,str):
+        return value.strip().lower() == 'true'
+    return bool(value)
+
+# Function to build a variable that we want in the workspace
+def new_var(key,value,category='terraform',hcl=False,sensitive=False,description=None):
+    return records.Variable(key=key,value=value,category=category,hcl=to_bool(hcl),sensitive=to_bool(sensitive),\
+        description=description)
+
+# Function to index the existing variables of a workspace by (key, category)
+def index_vars(existing):
+    return {(i.key,i.category): i for i in existing}
+
+# Function to know if an existing variable needs to be updated.
+# Values of sensitive variables are not returned by the API, so they are always updated
+def changed(current,desired):
+    if current.sensitive:
+        return True
+    for name,value in desired.attributes().items():
+        if getattr(current,name) != value:
+            return True
+    return False
+
+# Function to calculate the actions (create|update|delete|noop) to have the desired variables
+# (plan_copy adds "skip" for the variables that can't be copied).
+# If "prune" is True, existing variables that are not in the desired ones are deleted
+def plan_vars(existing,desired,prune=False):
+    index = index_vars(existing)
+    # If a variable is repeated in the input the last value is the one we keep
+    wanted = OrderedDict(((i.key,i.category),i) for i in desired)
+    plan = []
+    for key,var in wanted.items():
+        current = index.get(key)
+        if current is None:
+            action,var = 'create',var.replace(id=None)
+        elif changed(current,var):
+            # The API doesn't turn a sensitive variable back into a non-sensitive one (it rejects the
+            # update), so it stays sensitive and only the rest of the attributes are updated
+            action,var = 'update',var.replace(id=current.id,sensitive=var.sensitive or current.sensitive)
+        else:
+            action,var = 'noop',var.replace(id=current.id)
+        plan.append({'action': action, 'key': key[0], 'category': key[1], 'id': var.id, 'var': var})
+    if prune:
+        for key,current in index.items():
+            if key not in wanted:
+                plan.append({'action': 'delete', 'key': key[0], 'category': key[1], 'id': current.id, 'var': None})
+    return plan
+
+# Function to get the API call of a plan action: (method,url,payload), or None for "noop" and "skip".
+# The payload is built for every call, so concurrent calls never share it
+def action_request(workspace_id,item):
+    url = '/workspaces/' + workspace_id + '/vars'
+    if item['action'] == 'create':
+        return ('POST',url,item['var'].to_payload())
+    if item['action'] == 'update':
+        return ('PATCH',url + '/' + item['id'],item['var'].to_payload(update=True))
+    if item['action'] == 'delete':
+        return ('DELETE',url + '/' + item['id'],None)
+    return None
+
+# Function to do the API call of a plan action. Errors are returned and not raised,
+# so one failing variable doesn't stop the rest
+def run_action(client,workspace_id,item):
+    call = action_request(workspace_id,item)
+    if call is None:
+        return (item,'ok','')
+    method,url,payload = call
+    try:
+        if payload is None:
+            r = client.request(method,url)
+        else:
+            r = client.request(method,url,json=payload)
+        r.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        return (item,'error',str(err) + ' ' + err.response.text)
+    except requests.exceptions.RequestException as err:
+        return (item,'error',str(err))
+    return (item,'ok','')
+
+async def run_action_async(client,workspace_id,item):
+    call = action_request(workspace_id,item)
+    if call is None:
+        return (item,'ok','')
+    method,url,payload = call
+    try:
+        if payload is None:
+            r = await client.request(method,url)
+        else:
+            r = await client.request(method,url,json=payload)
+        r.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        return (item,'error',str(err) + ' ' + err.response.text)
+    except requests.exceptions.RequestException as err:
+        return (item,'error',str(err))
+    return (item,'ok','')
+
+# Function to run the plan actions concurrently with a pool of "workers" threads.
+# The results are returned in the same order as the plan
+def apply_plan(client,workspace_id,plan,workers=default_workers):
+    return [i[1:] for i in apply_plans(client,[(workspace_id,plan)],workers)]
+
+# Function to run the plans of many workspaces [(workspace_id,plan),...] in the same pool of threads.
+# Results are (workspace_id,item,status,message)
+def apply_plans(client,plans,workers=default_workers):
+    actions = [(wid,i) for wid,plan in plans for i in plan if i['action'] not in ('noop','skip')]
+    if not actions:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1,min(workers,len(actions)))) as pool:
+        return list(pool.map(lambda action: (action[0],) + run_action(client,action[0],action[1]),actions))
+
+# Same as apply_plans, with all the actions as coroutines (the client limits the calls in flight)
+async def apply_plans_async(client,plans):
+    actions = [(wid,i) for wid,plan in plans for i in plan if i['action'] not in ('noop','skip')]
+    results = await asyncio.gather(*[run_action_async(client,wid,item) for wid,item in actions])
+    return [(wid,) + result for (wid,_),result in zip(actions,results)]
+
+# Function to get the variables (records) of a workspace. It returns (variables,error)
+def fetch_vars(client,workspace_id):
+    try:
+        return ([records.Variable.from_api(i) for page in client.iter_pages('/workspaces/' + workspace_id + '/vars')\
+            for i in page],None)
+    except requests.exceptions.HTTPError as err:
+        return (None,str(err) + ' ' + err.response.text)
+    except requests.exceptions.RequestException as err:
+        return (None,str(err))
+
+# Function to get the variables of many workspaces in parallel. It returns {workspace_id: (variables,error)}
+def fetch_many(client,workspace_ids,workers=default_workers):
+    workspace_ids = list(workspace_ids)
+    if not workspace_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1,min(workers,len(workspace_ids)))) as pool:
+        return dict(zip(workspace_ids,pool.map(lambda wid: fetch_vars(client,wid),workspace_ids)))
+
+async def fetch_vars_async(client,workspace_id):
+    try:
+        return ([records.Variable.from_api(i) for i in await client.get_all('/workspaces/' + workspace_id + '/vars')],\
+            None)
+    except requests.exceptions.HTTPError as err:
+        return (None,str(err) + ' ' + err.response.text)
+    except requests.exceptions.RequestException as err:
+        return (None,str(err))
+
+async def fetch_many_async(client,workspace_ids):
+    workspace_ids = list(workspace_ids)
+    return dict(zip(workspace_ids,await asyncio.gather(*[fetch_vars_async(client,i) for i in workspace_ids])))
+
+# Function to use an existing variable (from the API) as a desired variable in other workspace
+def copy_var(var):
+    return var.replace(id=None)
+
+# Function to plan the copy of variables to a workspace. The API returns the values of sensitive variables
+# as null, so they can't be copied: their action is "skip" (instead of creating or overwriting the
+# variable with an empty value)
+def plan_copy(existing,source):
+    plan = plan_vars(existing,[copy_var(i) for i in source])
+    for item in plan:
+        if item['action'] in ('create','update') and item['var'].sensitive and item['var'].value is None:
+            item['action'] = 'skip'
+    return plan
+
+# Function to plan the deletion of the variables with some keys, or with keys matching a regex
+def plan_delete(existing,keys=None,pattern=None):
+    regex = re.compile(pattern) if pattern else None
+    plan = []
+    for i in existing:
+        if (keys and i.key in keys) or (regex and regex.search(i.key)):
+            plan.append({'action': 'delete', 'key': i.key, 'category': i.category, 'id': i.id, 'var': None})
+    return plan
+
+# Function to print the plan (values are never printed, they can be sensitive)
+def print_plan(plan,workspace=''):
+    symbols = {'create': '+', 'update': '~', 'delete': '-', 'noop': '=', 'skip': '!'}
+    print('\nVariables plan for workspace "' + workspace + '":')
+    for item in plan:
+        line = '  ' + symbols[item['action']] + ' ' + item['action'].ljust(6) + '  ' + item['category'].ljust(9) + '  ' + item['key']
+        if item['action'] == 'skip':
+            line = line + '  (sensitive, value not readable - not copied)'
+        print(line)
+    counts = {action: len([i for i in plan if i['action'] == action]) for action in symbols}
+    print('Plan: %d to create, %d to update, %d to delete, %d unchanged' % (counts['create'],counts['update'],\
+        counts['delete'],counts['noop']) + (', %d not copied' % counts['skip'] if counts['skip'] else ''))
+
+# Function to print the failed actions. It returns the number of errors
+def print_results(results):
+    errors = [i for i in results if i[1] == 'error']
+    print('Applied %d changes, %d errors' % (len(results) - len(errors),len(errors)))
+    for item,status,message in errors:
+        print('  ' + item['action'] + ' ' + item['key'] + ' (' + item['category'] + '): ' + message)
+    return len(errors)
+
+# Function to print a summary line per workspace from apply_plans results. It returns the number of errors
+def print_summary(names,plans,results):
+    errors = 0
+    print('\nSummary by workspace:')
+    for wid,plan in plans:
+        done = [i for i in results if i[0] == wid]
+        failed = [i for i in done if i[2] == 'error']
+        errors += len(failed)
+        counts = {action: len([i for i in plan if i['action'] == action]) for action in ('create','update','delete','noop',\
+            'skip')}
+        print('  %s: %d created, %d updated, %d deleted, %d unchanged, %d errors' % (names[wid],counts['create'],\
+            counts['update'],counts['delete'],counts['noop'],len(failed)) + (', %d not copied (sensitive)' % \
+            counts['skip'] if counts['skip'] else ''))
+        for _,item,status,message in failed:
+            print('    ' + item['action'] + ' ' + item['key'] + ' (' + item['category'] + '): ' + message)
+    return errors
+
+# Function to print the outcome of every action from apply_plans results
+def print_outcomes(names,results):
+    print('\nResults:')
+    for wid,item,status,message in results:
+        line = '  ' + names[wid] + ': ' + item['action'] + ' ' + item['key'] + ' (' + item['category'] + ') ' + status
+        if message:
+            line = line + ' - ' + message
+        print(line)
@@ -0,0 +1,160 @@
+# Python module with the API calls for workspaces, variables and runs of Terraform Cloud
+# All the functions take the client (tfcclient.TFCClient) as first argument, so they can be used from
+# any Python code with its own credentials. HTTP errors are raised as requests.exceptions.HTTPError.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import TFCClient, workspaces
+#   client = TFCClient(token)
+#   for i in workspaces.iter_workspaces(client,'<org>'):
+#       print(i['attributes']['name'])
+
+
+import re
+import fnmatch
+from . import jsonapi
+from . import records
+from . import runwatch
+
+# Max page size allowed by the API and default number of threads to fetch pages
+max_page_size = 100
+page_workers = 8
+
+# Attributes used by the functions that only need to find workspaces (sparse fieldset, "fields[workspaces]")
+find_fields = ['name','tag-names']
+
+# Wildcards of the glob patterns (fnmatch)
+glob_wildcards = re.compile(r'\*|\?|\[[^\]]*\]')
+
+# Function to list workspaces
+def list_workspace(client,organization,wname=None):
+    url = '/organizations/' + organization + '/workspaces/'
+    if wname:
+        url = url + wname
+    r = client.get(url)
+    r.raise_for_status()
+    return jsonapi.document(r)['data']
+
+# Function to get the params of a workspaces list that are filtered by the API: "search" (part of the name),
+# "tags" (list of tags, all of them needed) and "fields" (list of attributes to get, instead of all of them)
+def list_params(search=None,tags=None,fields=None):
+    params = {}
+    if search:
+        params['search[name]'] = search
+    if tags:
+        params['search[tags]'] = ','.join(tags)
+    if fields:
+        params['fields[workspaces]'] = ','.join(fields)
+    return params
+
+# Function to get the longest part of a glob pattern without wildcards ("prod-*-db" -> "prod-"),
+# to send it as "search[name]" so the API only returns the workspaces that can match the pattern
+def glob_search(pattern):
+    return max(glob_wildcards.split(pattern or ''),key=len) or None
+
+# Generator to iterate the workspaces of an organization record by record.
+# Pages are requested as they are consumed, so the caller gets the first workspaces right away.
+# "search", "tags" and "fields" are filtered by the API (see list_params), and the workspaces are projected
+# to records with only the "fields" attributes, even if the API sends all of them
+def iter_workspaces(client,organization,page_size=None,workers=page_workers,search=None,tags=None,fields=None):
+    if page_size:
+        page_size = min(page_size,max_page_size)
+    for page in client.iter_pages('/organizations/' + organization + '/workspaces/',\
+        params=list_params(search,tags,fields),page_size=page_size,workers=workers,fields=fields):
+        for item in page:
+            yield item
+
+# Function to list workspaces (or a workspace details with "wname")
+def getlist(client,organization,wname=None,page_size=None,workers=page_workers,search=None,tags=None,fields=None):
+    if wname:
+        # When getting individual objects we are getting the dict and not list
+        return [list_workspace(client,organization,wname)]
+    return list(iter_workspaces(client,organization,page_size,workers,search,tags,fields))
+
+# Function to create a workspace. "payload" is the full JSON payload (only the name is set if not)
+# If a WorkspaceCache is passed (wscache module) the new id is saved there
+def create_workspace(client,organization,workspace,payload=None,cache=None):
+    if payload is None:
+        payload = {
+            "data": {
+                "attributes": {
+                    "name": workspace
+                },
+                "type": "workspaces"
+            }
+        }
+    r = client.post('/organizations/' + organization + '/workspaces',json=payload)
+    r.raise_for_status()
+    doc = jsonapi.document(r)
+    if cache is not None:
+        cache.set(organization,doc['data']['attributes']['name'],doc['data']['id'])
+    return doc
+
+# Function to delete workspace
+def delete_workspace(client,workspace_id,cache=None):
+    r = client.delete('/workspaces/' + workspace_id)
+    r.raise_for_status()
+    if cache is not None:
+        cache.invalidate_id(workspace_id)
+
+# Function to delete variables
+def delete_var(client,workspace_id,var_id):
+    r = client.delete('/workspaces/' + workspace_id + '/vars/' + var_id)
+    r.raise_for_status()
+
+# Generator to iterate the variables of a workspace record by record
+def iter_vars(client,workspace_id):
+    for page in client.iter_pages('/workspaces/' + workspace_id + '/vars'):
+        for item in page:
+            yield item
+
+# Function to get variables from a workspace
+def get_vars(client,workspace_id):
+    return {'data': list(iter_vars(client,workspace_id))}
+
+# Function to get the variables of a workspace as records (records.Variable)
+def get_variables(client,workspace_id):
+    return [records.Variable.from_api(i) for i in iter_vars(client,workspace_id)]
+
+# Function to get a variable (records.Variable, a new one if None) with the "name", "value", "env" and
+# "sensitive" kwargs set. The variable passed is not changed, so the same one can be used in many calls
+def set_var_attributes(var=None,**kwargs):
+    names = {'name': 'key', 'value': 'value', 'env': 'category', 'sensitive': 'sensitive'}
+    return (var or records.Variable()).replace(**{names[k]: v for k,v in kwargs.items()})
+
+# Function to create variables
+def create_var(client,workspace_id,var=None,**kwargs):
+    r = client.post('/workspaces/' + workspace_id + '/vars',json=set_var_attributes(var,**kwargs).to_payload())
+    r.raise_for_status()
+    return jsonapi.document(r)
+
+def update_var(client,workspace_id,var_id,var=None,**kwargs):
+    r = client.patch('/workspaces/' + workspace_id + '/vars/' + var_id,\
+        json=set_var_attributes(var,**kwargs).replace(id=var_id).to_payload(update=True))
+    r.raise_for_status()
+    return jsonapi.document(r)
+
+def run_workspace(client,wid,message,destroy=False,auto=False):
+    if destroy is True:
+        message = 'Destroying... ' + message
+    r = client.post('/runs',json=runwatch.run_payload(wid,message,destroy,auto))
+    r.raise_for_status()
+    return jsonapi.document(r)
+
+# Function to find workspaces by name pattern (glob) and/or tag. It returns {workspace_id: name,...}
+# The tag and the literal part of the pattern are filtered by the API, and the pattern is checked while
+# the pages are read. If a WorkspaceCache is passed (wscache module) the ids found are saved there
+def find_workspaces(client,org,pattern=None,tag=None,cache=None):
+    found = {}
+    for i in iter_workspaces(client,org,max_page_size,search=glob_search(pattern),tags=[tag] if tag else None,\
+        fields=find_fields):
+        name = i['attributes']['name']
+        if pattern and not fnmatch.fnmatchcase(name,pattern):
+            continue
+        if tag and tag not in i['attributes'].get('tag-names',[]):
+            continue
+        if cache is not None:
+            cache.set(org,name,i['id'])
+        found[i['id']] = name
+    return found
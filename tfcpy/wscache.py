@@ -0,0 +1,116 @@
+# Python module to cache the workspace name to workspace id resolution of Terraform Cloud
+# The cache is kept on disk (by default in ~/.cache/tfc-python/workspaces.json), so consecutive
+# executions of the scripts don't need to do an API call just to know the id of a workspace.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import wscache
+#   cache = wscache.WorkspaceCache(scope=tfapi,ttl=3600)
+#   client.session.hooks['response'].append(cache.response_hook)
+#   wid = cache.get(org,workspace)
+
+
+import os,json
+import re
+import time
+import threading
+import tempfile
+from collections import OrderedDict
+
+cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME',os.path.expanduser('~/.cache')),'tfc-python')
+default_ttl = 3600
+default_max_entries = 2000
+
+# Pattern to find the workspace id in the API urls that return a 404
+ws_id_pattern = re.compile(r'/workspaces/(ws-[A-Za-z0-9]+)')
+
+# Class for the name -> id cache, with TTL expiration and LRU eviction
+class WorkspaceCache:
+    def __init__(self,scope='',ttl=default_ttl,max_entries=default_max_entries,\
+        path=os.path.join(cache_dir,'workspaces.json')):
+        # The scope (API url) is part of the key, so TFC and TFE ids don't get mixed
+        self.scope = scope
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()
+        self.dirty = False
+        self.lock = threading.Lock()
+        if self.enabled():
+            self.load()
+
+    def enabled(self):
+        return self.ttl > 0
+
+    def key(self,org,name):
+        return self.scope + '|' + org + '|' + name
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.entries = OrderedDict(json.load(f))
+        except (OSError,ValueError):
+            self.entries = OrderedDict()
+
+    # Writing to a temp file and renaming it, so concurrent executions never read a half written file
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path),exist_ok=True)
+                fd,tmp = tempfile.mkstemp(dir=os.path.dirname(self.path),prefix='.workspaces-')
+                with os.fdopen(fd,'w') as f:
+                    json.dump(list(self.entries.items()),f)
+                os.replace(tmp,self.path)
+                self.dirty = False
+            except OSError as err:
+                print('Cannot write workspaces cache file "' + self.path + '": ' + str(err))
+
+    def get(self,org,name):
+        if not self.enabled():
+            return None
+        key = self.key(org,name)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            wid,created = entry
+            if time.time() - created > self.ttl:
+                del self.entries[key]
+                self.dirty = True
+                return None
+            self.entries.move_to_end(key)
+            self.dirty = True
+            return wid
+
+    def set(self,org,name,wid):
+        if not self.enabled():
+            return
+        key = self.key(org,name)
+        with self.lock:
+            self.entries[key] = [wid,time.time()]
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    def invalidate(self,org,name):
+        with self.lock:
+            if self.entries.pop(self.key(org,name),None) is not None:
+                self.dirty = True
+
+    def invalidate_id(self,wid):
+        with self.lock:
+            for key in [k for k,v in self.entries.items() if v[0] == wid]:
+                del self.entries[key]
+                self.dirty = True
+
+    # requests response hook: a 404 on a workspace url means that the cached id is not valid anymore
+    def response_hook(self,r,*args,**kwargs):
+        if r.status_code == 404:
+            match = ws_id_pattern.search(r.url)
+            if match:
+                self.invalidate_id(match.group(1))
+        return r
@@ -0,0 +1,168 @@
+# Python module with a local index (SQLite) of the workspaces of an organization and their variables
+# The index is refreshed from the API, and then it can be searched offline by name pattern, tag, Terraform
+# version or variable key, in milliseconds, instead of reading the variables of every workspace again.
+# Only the keys and the metadata of the variables are saved: never their values.
+#
+# Developer: David Canadillas - dcanadillas@hashicorp.com
+#
+# Usage:
+#   from tfcpy import wsindex
+#   index = wsindex.WorkspaceIndex(scope=tfapi)
+#   index.refresh(client,'<org>')
+#   for i in index.search('<org>',var_key='AWS_*'):
+#       print(i['name'],i['vars'])
+#
+# The refresh is incremental: the list of workspaces is always read (1 call per 100 workspaces, so deleted
+# workspaces are removed), but the variables are only read for the workspaces that are new, or whose
+# "updated-at" changed since the last refresh. The API doesn't tell when the variables of a workspace
+# changed (and changing them doesn't always change "updated-at"), so the variables of a workspace that was
+# not updated can be stale: a full refresh (refresh(...,full=True)) reads all of them again.
+
+
+import os
+import time
+from . import records
+from . import varsync
+from . import workspaces as wsapi
+from .lazy import lazy_import
+from .wscache import cache_dir
+
+sqlite3 = lazy_import('sqlite3')
+
+index_path = os.path.join(cache_dir,'index.sqlite')
+# Workspace attributes saved in the index (the rest are not requested to the API)
+index_fields = ['name','terraform-version','updated-at','tag-names']
+
+schema = '''
+create table if not exists workspaces (
+    scope text not null, organization text not null, id text not null, name text not null,
+    terraform_version text, updated_at text, vars_updated_at text,
+    primary key (scope,id));
+create index if not exists workspaces_name on workspaces (scope,organization,name);
+create table if not exists tags (
+    scope text not null, workspace_id text not null, tag text not null);
+create index if not exists tags_workspace on tags (scope,workspace_id);
+create index if not exists tags_tag on tags (scope,tag);
+create table if not exists vars (
+    scope text not null, workspace_id text not null, id text not null, key text not null,
+    category text, hcl integer, sensitive integer, description text);
+create index if not exists vars_workspace on vars (scope,workspace_id);
+create index if not exists vars_key on vars (scope,key);
+create table if not exists refreshes (
+    scope text not null, organization text not null, refreshed_at real,
+    primary key (scope,organization));
+'''
+
+# Class for the index file. The scope (API url) is part of every key, so TFC and TFE data don't get mixed
+class WorkspaceIndex:
+    def __init__(self,scope='',path=index_path):
+        self.scope = scope
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path),exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(schema)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    # Function to get the time (epoch) of the last refresh of an organization, or None
+    def refreshed_at(self,organization):
+        row = self.db.execute('select refreshed_at from refreshes where scope = ? and organization = ?',\
+            (self.scope,organization)).fetchone()
+        return row['refreshed_at'] if row else None
+
+    # Function to update the index of an organization from the API. "fetch_many" gets the variables of
+    # many workspaces ({workspace_id: (variables,error)}, like varsync.fetch_many). With "full" the
+    # variables of all the workspaces are read again. Workspaces whose variables couldn't be read are
+    # read again in the next refresh. It returns the counters of the refresh
+    def refresh(self,client,organization,fetch_many=None,full=False,workers=wsapi.page_workers,cache=None):
+        if fetch_many is None:
+            fetch_many = lambda ids: varsync.fetch_many(client,ids)
+        listed = [records.Workspace.from_api(i) for i in wsapi.iter_workspaces(client,organization,\
+            wsapi.max_page_size,workers,fields=index_fields)]
+        known = {row['id']: row['vars_updated_at'] for row in self.db.execute(\
+            'select id,vars_updated_at from workspaces where scope = ? and organization = ?',(self.scope,organization))}
+        stale = [i.id for i in listed if full or i.id not in known or known[i.id] is None or\
+            known[i.id] != i.updated_at]
+        fetched = fetch_many(stale) if stale else {}
+        removed = set(known) - set(i.id for i in listed)
+        counters = {'workspaces': len(listed), 'added': len([i for i in listed if i.id not in known]),\
+            'removed': len(removed), 'vars_read': 0, 'errors': {}}
+        with self.db:
+            for wid in removed:
+                self.delete_workspace(wid)
+            for i in listed:
+                if cache is not None:
+                    cache.set(organization,i.name,i.id)
+                vars_updated_at = known.get(i.id)
+                if i.id in fetched:
+                    variables,error = fetched[i.id]
+                    if error is None:
+                        self.save_vars(i.id,variables)
+                        vars_updated_at = i.updated_at
+                        counters['vars_read'] += 1
+                    else:
+                        counters['errors'][i.name] = error
+                        vars_updated_at = None
+                self.db.execute('insert or replace into workspaces (scope,organization,id,name,terraform_version,'\
+                    'updated_at,vars_updated_at) values (?,?,?,?,?,?,?)',(self.scope,organization,i.id,i.name,\
+                    i.terraform_version,i.updated_at,vars_updated_at))
+                self.db.execute('delete from tags where scope = ? and workspace_id = ?',(self.scope,i.id))
+                self.db.executemany('insert into tags (scope,workspace_id,tag) values (?,?,?)',\
+                    [(self.scope,i.id,tag) for tag in i.tags])
+            self.db.execute('insert or replace into refreshes (scope,organization,refreshed_at) values (?,?,?)',\
+                (self.scope,organization,time.time()))
+        return counters
+
+    def delete_workspace(self,workspace_id):
+        for table,column in (('workspaces','id'),('tags','workspace_id'),('vars','workspace_id')):
+            self.db.execute('delete from ' + table + ' where scope = ? and ' + column + ' = ?',\
+                (self.scope,workspace_id))
+
+    # The values are not saved, only the keys and metadata of the variables (records.Variable)
+    def save_vars(self,workspace_id,variables):
+        self.db.execute('delete from vars where scope = ? and workspace_id = ?',(self.scope,workspace_id))
+        self.db.executemany('insert into vars (scope,workspace_id,id,key,category,hcl,sensitive,description) '\
+            'values (?,?,?,?,?,?,?,?)',[(self.scope,workspace_id,i.id,i.key,i.category,int(i.hcl),int(i.sensitive),\
+            i.description) for i in variables])
+
+    # Function to find workspaces of the index. "pattern" and "var_key" are glob patterns (like "prod-*"),
+    # and all the conditions must match. It returns a list of dicts with the workspace details, its tags,
+    # and its variables (only the ones matching "var_key" if it's set), sorted by name
+    def search(self,organization,pattern=None,tag=None,terraform_version=None,var_key=None):
+        query = 'select * from workspaces w where scope = ? and organization = ?'
+        params = [self.scope,organization]
+        if pattern:
+            query += ' and name glob ?'
+            params.append(pattern)
+        if tag:
+            query += ' and exists (select 1 from tags t where t.scope = w.scope and t.workspace_id = w.id and t.tag = ?)'
+            params.append(tag)
+        if terraform_version:
+            query += ' and terraform_version glob ?'
+            params.append(terraform_version)
+        if var_key:
+            query += ' and exists (select 1 from vars v where v.scope = w.scope and v.workspace_id = w.id and '\
+                'v.key glob ?)'
+            params.append(var_key)
+        found = []
+        for row in self.db.execute(query + ' order by name',params).fetchall():
+            item = {'id': row['id'], 'name': row['name'], 'terraform_version': row['terraform_version'],\
+                'updated_at': row['updated_at'], 'tags': [t['tag'] for t in self.db.execute(\
+                'select tag from tags where scope = ? and workspace_id = ? order by tag',(self.scope,row['id']))]}
+            vars_query = 'select key,category,hcl,sensitive,description from vars where scope = ? and workspace_id = ?'
+            vars_params = [self.scope,row['id']]
+            if var_key:
+                vars_query += ' and key glob ?'
+                vars_params.append(var_key)
+            item['vars'] = [dict(v) for v in self.db.execute(vars_query + ' order by key',vars_params)]
+            found.append(item)
+        return found